@@ -0,0 +1,134 @@
+import io
+import json
+import logging
+from urllib.parse import unquote_to_bytes, urlsplit
+
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import Http404
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+# Заголовки пакетного запроса, которые не относятся к подзапросам.
+SKIPPED_META = frozenset(
+    (
+        "CONTENT_LENGTH",
+        "CONTENT_TYPE",
+        "HTTP_IF_MATCH",
+        "HTTP_IF_MODIFIED_SINCE",
+        "HTTP_IF_NONE_MATCH",
+        "HTTP_IF_RANGE",
+        "HTTP_IF_UNMODIFIED_SINCE",
+        "HTTP_RANGE",
+    )
+)
+# Заголовки ответа подзапроса, которые передаются клиенту.
+RESPONSE_HEADERS = ("ETag", "Location")
+
+
+def build_request(request, path):
+    """
+    GET-подзапрос с окружением исходного запроса.
+    Пользователь передаётся уже аутентифицированным, а связи
+    пользователя, загруженные для пакета, - общими для всех
+    подзапросов, поэтому токен и связи не читаются повторно.
+    """
+
+    http_request = getattr(request, "_request", request)
+    parts = urlsplit(path)
+    environ = {
+        key: value
+        for key, value in http_request.META.items()
+        if key not in SKIPPED_META
+    }
+    environ.update(
+        {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": unquote_to_bytes(parts.path).decode("iso-8859-1"),
+            "QUERY_STRING": parts.query,
+            "wsgi.input": io.BytesIO(b""),
+        }
+    )
+    sub_request = WSGIRequest(environ)
+    sub_request.user = request.user
+    if request.user.is_authenticated:
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+    relations = getattr(http_request, "user_relations", None)
+    if relations is not None:
+        sub_request.user_relations = relations
+    return sub_request
+
+
+def _dumps(data):
+    return json.dumps(
+        data, ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def _error(status, detail):
+    return status, _dumps({"detail": detail}), {}
+
+
+def dispatch(request, path):
+    """
+    Выполняет один подзапрос через обработчик из URLconf.
+    Возвращает (статус, JSON-тело в байтах или None, заголовки).
+    """
+
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return _error(404, "Страница не найдена.")
+    try:
+        response = match.func(
+            build_request(request, path), *match.args, **match.kwargs
+        )
+    except Http404:
+        return _error(404, "Страница не найдена.")
+    except PermissionDenied:
+        return _error(403, "Доступ запрещён.")
+    except Exception:
+        logger.exception("Ошибка подзапроса %s", path)
+        return _error(500, "Ошибка сервера.")
+    return _read(response)
+
+
+def _read(response):
+    if response.streaming:
+        # response.close() отправил бы request_finished и закрыл
+        # соединение с базой посреди пакета: освобождаем только
+        # ресурсы самого ответа.
+        for closer in getattr(response, "_resource_closers", ()):
+            closer()
+        return _error(406, "Ответ не поддерживается в пакетном запросе.")
+    if hasattr(response, "render"):
+        response.render()
+    headers = {
+        name: response[name]
+        for name in RESPONSE_HEADERS
+        if response.has_header(name)
+    }
+    content_type = response.get("Content-Type", "")
+    if not response.content:
+        return response.status_code, None, headers
+    if not content_type.startswith("application/json"):
+        return _error(406, "Ответ не поддерживается в пакетном запросе.")
+    return response.status_code, response.content, headers
+
+
+def run(request, paths):
+    """
+    Выполняет подзапросы по порядку и собирает ответ пакета:
+    {"responses": [{"path", "status", "headers", "body"}]}.
+    Готовые JSON-тела подзапросов вставляются как есть,
+    без повторного разбора и сериализации.
+    """
+
+    parts = []
+    for path in paths:
+        status, body, headers = dispatch(request, path)
+        meta = _dumps({"path": path, "status": status, "headers": headers})
+        parts.append(meta[:-1] + b',"body":' + (body or b"null") + b"}")
+    return b'{"responses":[' + b",".join(parts) + b"]}"
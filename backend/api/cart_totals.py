@@ -0,0 +1,198 @@
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from api import constants, links
+from food.models import (
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingCartIngredient,
+)
+
+TOTALS = ShoppingCartIngredient._meta.db_table
+CART = ShoppingCart._meta.db_table
+ITEMS = RecipeIngredient._meta.db_table
+
+LOCK_SQL = f"""
+    SELECT 1 FROM {TOTALS}
+    WHERE user_id = ANY(%s) AND ingredient_id = ANY(%s)
+    ORDER BY user_id, ingredient_id
+    FOR UPDATE
+"""
+ADD_SQL = f"""
+    INSERT INTO {TOTALS} (user_id, ingredient_id, total_amount)
+    SELECT users.id, delta.ingredient_id, delta.amount
+    FROM unnest(%s::bigint[]) AS users(id)
+    CROSS JOIN unnest(%s::bigint[], %s::integer[])
+        AS delta(ingredient_id, amount)
+    ORDER BY users.id, delta.ingredient_id
+    ON CONFLICT (user_id, ingredient_id) DO UPDATE
+    SET total_amount = {TOTALS}.total_amount + EXCLUDED.total_amount
+"""
+SUBTRACT_SQL = f"""
+    UPDATE {TOTALS}
+    SET total_amount = GREATEST({TOTALS}.total_amount - delta.amount, 0)
+    FROM unnest(%s::bigint[], %s::integer[]) AS delta(ingredient_id, amount)
+    WHERE {TOTALS}.user_id = ANY(%s)
+    AND {TOTALS}.ingredient_id = delta.ingredient_id
+"""
+CLEANUP_SQL = f"""
+    DELETE FROM {TOTALS} WHERE user_id = ANY(%s) AND total_amount = 0
+"""
+REBUILD_SQL = f"""
+    INSERT INTO {TOTALS} (user_id, ingredient_id, total_amount)
+    SELECT cart.user_id, item.ingredient_id, SUM(item.amount)
+    FROM {CART} AS cart
+    JOIN {ITEMS} AS item ON item.recipe_id = cart.recipe_id
+    GROUP BY cart.user_id, item.ingredient_id
+"""
+
+
+def recipe_amounts(recipe_id):
+    """
+    Количество каждого ингредиента в рецепте: {id ингредиента: сумма}.
+    """
+
+    return recipes_amounts([recipe_id])
+
+
+def recipes_amounts(recipe_ids):
+    """
+    Суммарное количество каждого ингредиента в рецептах recipe_ids
+    одним запросом: {id ингредиента: сумма}.
+    """
+
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .order_by()
+        .values("ingredient_id")
+        .annotate(amount=Sum("amount"))
+        .values_list("ingredient_id", "amount")
+    )
+
+
+def apply_deltas(user_ids, deltas):
+    """
+    Прибавляет к итогам списков покупок пользователей user_ids
+    изменения {id ингредиента: приращение}. Положительные приращения
+    применяются одним upsert, отрицательные - одним UPDATE,
+    обнулившиеся строки удаляются.
+    Строки итогов блокируются и вставляются в порядке
+    (пользователь, ингредиент), чтобы параллельные изменения
+    одних и тех же итогов не взаимоблокировались.
+    """
+
+    user_ids = sorted(user_ids)
+    deltas = sorted((pk, delta) for pk, delta in deltas.items() if delta)
+    added = {pk: delta for pk, delta in deltas if delta > 0}
+    subtracted = {pk: -delta for pk, delta in deltas if delta < 0}
+    if not user_ids or not deltas:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(LOCK_SQL, [user_ids, [pk for pk, _ in deltas]])
+        if added:
+            cursor.execute(
+                ADD_SQL, [user_ids, list(added), list(added.values())]
+            )
+        if subtracted:
+            cursor.execute(
+                SUBTRACT_SQL,
+                [list(subtracted), list(subtracted.values()), user_ids],
+            )
+            cursor.execute(CLEANUP_SQL, [user_ids])
+
+
+def lock_recipes(recipe_ids):
+    """
+    Блокирует строки рецептов до конца транзакции в порядке id
+    и возвращает множество id существующих рецептов.
+    Вставка строки корзины берёт на рецепт лишь KEY SHARE, поэтому
+    без этой блокировки добавление в корзину и изменение состава
+    рецепта могут прочитать разные версии ингредиентов.
+    """
+
+    return links.lock_targets(Recipe, recipe_ids)
+
+
+def add_recipe(user_id, recipe_id):
+    """
+    Добавляет ингредиенты рецепта в итоги списка покупок пользователя.
+    """
+
+    add_recipes(user_id, [recipe_id])
+
+
+def remove_recipe(user_id, recipe_id):
+    """
+    Вычитает ингредиенты рецепта из итогов списка покупок пользователя.
+    """
+
+    remove_recipes(user_id, [recipe_id])
+
+
+def add_recipes(user_id, recipe_ids):
+    """
+    Добавляет ингредиенты нескольких рецептов в итоги списка покупок
+    пользователя за постоянное число запросов.
+    """
+
+    if recipe_ids:
+        apply_deltas([user_id], recipes_amounts(recipe_ids))
+
+
+def remove_recipes(user_id, recipe_ids):
+    """
+    Вычитает ингредиенты нескольких рецептов из итогов списка покупок
+    пользователя за постоянное число запросов.
+    """
+
+    if recipe_ids:
+        amounts = recipes_amounts(recipe_ids)
+        apply_deltas(
+            [user_id], {pk: -amount for pk, amount in amounts.items()}
+        )
+
+
+def propagate_recipe(recipe_id, old_amounts, new_amounts):
+    """
+    Переносит изменение состава рецепта в итоги всех списков покупок,
+    где он есть. Вызывается в транзакции изменения рецепта, и все
+    блокировки строк итогов держатся до её фиксации. Пользователи
+    обрабатываются пачками только для того, чтобы ограничить размер
+    запросов и не загружать всех пользователей в память.
+    """
+
+    deltas = {
+        pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+        for pk in old_amounts.keys() | new_amounts.keys()
+    }
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    user_ids = (
+        ShoppingCart.objects.filter(recipe_id=recipe_id)
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+        .distinct()
+        .iterator(chunk_size=constants.CART_TOTALS_BATCH_SIZE)
+    )
+    batch = []
+    for user_id in user_ids:
+        batch.append(user_id)
+        if len(batch) == constants.CART_TOTALS_BATCH_SIZE:
+            apply_deltas(batch, deltas)
+            batch = []
+    apply_deltas(batch, deltas)
+
+
+@transaction.atomic
+def rebuild():
+    """
+    Пересчитывает итоги всех списков покупок с нуля.
+    Возвращает число строк итогов.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TOTALS}")
+        cursor.execute(REBUILD_SQL)
+        return cursor.rowcount
@@ -0,0 +1,307 @@
+import bisect
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError
+from rest_framework.renderers import JSONRenderer
+
+from api import constants, versions
+from food.models import Ingredient, Tag
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"FGCAT2"
+# magic, число ингредиентов, число тегов,
+# смещения таблиц ингредиентов и тегов.
+HEADER = struct.Struct("<6s2xIIQQ")
+OFFSET = struct.Struct("<Q")
+# id, длины ключа, названия и единицы измерения.
+INGREDIENT = struct.Struct("<QHHH")
+# id, длины названия и слага.
+TAG = struct.Struct("<QHH")
+
+
+def _encode(value):
+    return value.encode("utf-8")
+
+
+def _sort_key(value):
+    """
+    Ключ сортировки и поиска ингредиентов: название в нижнем регистре
+    с «ё», приравненной к «е», как в русской сортировке базы данных.
+    Байты UTF-8 иначе ставят «ё» после «я». Прочие тонкости правил
+    сортировки базы (пробелы, знаки препинания) не учитываются.
+    """
+
+    return _encode(value.casefold().replace("ё", "е"))
+
+
+def build_snapshot():
+    """
+    Собирает бинарный снимок каталога ингредиентов и тегов.
+    Ингредиенты упорядочены по ключу _sort_key от названия,
+    теги - по названию. Для каждой части пишется таблица смещений
+    записей, что позволяет искать прямо по отображённому файлу.
+    """
+
+    ingredients = sorted(
+        (_sort_key(name), pk, _encode(name), _encode(unit))
+        for pk, name, unit in Ingredient.objects.values_list(
+            "id", "name", "measurement_unit"
+        )
+    )
+    tags = [
+        (pk, _encode(name), _encode(slug))
+        for pk, name, slug in Tag.objects.order_by("name", "id").values_list(
+            "id", "name", "slug"
+        )
+    ]
+
+    records = bytearray()
+    ingredient_offsets = []
+    tag_offsets = []
+    base = HEADER.size + OFFSET.size * (len(ingredients) + len(tags))
+    for key, pk, name, unit in ingredients:
+        ingredient_offsets.append(base + len(records))
+        records += INGREDIENT.pack(pk, len(key), len(name), len(unit))
+        records += key + name + unit
+    for pk, name, slug in tags:
+        tag_offsets.append(base + len(records))
+        records += TAG.pack(pk, len(name), len(slug))
+        records += name + slug
+
+    ingredient_table = HEADER.size
+    tag_table = ingredient_table + OFFSET.size * len(ingredients)
+    data = bytearray(
+        HEADER.pack(
+            MAGIC, len(ingredients), len(tags), ingredient_table, tag_table
+        )
+    )
+    for offset in ingredient_offsets + tag_offsets:
+        data += OFFSET.pack(offset)
+    return bytes(data + records)
+
+
+def write_snapshot(path=None):
+    """
+    Записывает снимок каталога атомарно: во временный файл
+    с последующим переименованием. Процессы, которые уже отобразили
+    предыдущую версию, подхватят новую при следующем обращении.
+    """
+
+    path = str(path or settings.CATALOG_SNAPSHOT_PATH)
+    data = build_snapshot()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".catalog-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(data)
+
+
+class _IngredientKeys:
+    """
+    Последовательность ключей ингредиентов поверх снимка для bisect.
+    """
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def __len__(self):
+        return self._snapshot.ingredient_count
+
+    def __getitem__(self, position):
+        return self._snapshot.ingredient_key(position)
+
+
+class CatalogSnapshot:
+    """
+    Снимок каталога, отображённый в память (mmap) только для чтения.
+    Страницы файла общие для всех процессов gunicorn на машине,
+    поэтому каждый воркер не держит собственную копию каталога.
+    Файл перечитывается, когда он был заменён на диске.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._stat = None
+        self._buffer = b""
+        self.ingredient_count = 0
+        self.tag_count = 0
+        self._ingredient_table = 0
+        self._tag_table = 0
+
+    @property
+    def path(self):
+        return str(self._path or settings.CATALOG_SNAPSHOT_PATH)
+
+    def _open(self):
+        with open(self.path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, ingredients, tags, ingredient_table, tag_table = (
+            HEADER.unpack_from(buffer)
+        )
+        if magic != MAGIC:
+            raise ValueError(f"Неверный формат снимка каталога {self.path}")
+        self._buffer = buffer
+        self.ingredient_count = ingredients
+        self.tag_count = tags
+        self._ingredient_table = ingredient_table
+        self._tag_table = tag_table
+        self._stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            write_snapshot(self.path)
+            stat = os.stat(self.path)
+        if (stat.st_ino, stat.st_mtime_ns, stat.st_size) != self._stat:
+            with self._lock:
+                try:
+                    self._open()
+                except ValueError:
+                    # Снимок прежнего формата строится заново.
+                    write_snapshot(self.path)
+                    self._open()
+
+    def warm(self):
+        """
+        Отображает снимок заранее, при старте процесса.
+        """
+
+        try:
+            self._refresh()
+        except DatabaseError:
+            logger.warning("Снимок каталога будет построен позже")
+
+    def _offset(self, table, position):
+        return OFFSET.unpack_from(
+            self._buffer, table + OFFSET.size * position
+        )[0]
+
+    def ingredient_key(self, position):
+        offset = self._offset(self._ingredient_table, position)
+        _, key_length, _, _ = INGREDIENT.unpack_from(self._buffer, offset)
+        start = offset + INGREDIENT.size
+        return self._buffer[start:start + key_length]
+
+    def ingredient(self, position):
+        offset = self._offset(self._ingredient_table, position)
+        pk, key_length, name_length, unit_length = INGREDIENT.unpack_from(
+            self._buffer, offset
+        )
+        start = offset + INGREDIENT.size + key_length
+        middle = start + name_length
+        return {
+            "id": pk,
+            "name": self._buffer[start:middle].decode("utf-8"),
+            "measurement_unit": self._buffer[
+                middle:middle + unit_length
+            ].decode("utf-8"),
+        }
+
+    def tag(self, position):
+        offset = self._offset(self._tag_table, position)
+        pk, name_length, slug_length = TAG.unpack_from(self._buffer, offset)
+        start = offset + TAG.size
+        middle = start + name_length
+        return {
+            "id": pk,
+            "name": self._buffer[start:middle].decode("utf-8"),
+            "slug": self._buffer[middle:middle + slug_length].decode("utf-8"),
+        }
+
+    def ingredients(self):
+        """
+        Весь каталог ингредиентов, отсортированный по названию.
+        """
+
+        self._refresh()
+        return [self.ingredient(i) for i in range(self.ingredient_count)]
+
+    def search_ingredients(
+        self, prefix, limit=constants.INGREDIENT_SEARCH_LIMIT
+    ):
+        """
+        Ингредиенты, название которых начинается с prefix
+        (без учёта регистра и различия «е» и «ё»), не более limit штук.
+        Бинарный поиск идёт прямо по отображённому файлу.
+        """
+
+        self._refresh()
+        prefix = _sort_key(prefix)
+        keys = _IngredientKeys(self)
+        position = bisect.bisect_left(keys, prefix)
+        stop = min(len(keys), position + limit)
+        result = []
+        while position < stop and keys[position].startswith(prefix):
+            result.append(self.ingredient(position))
+            position += 1
+        return result
+
+    def tags(self):
+        """
+        Все теги, отсортированные по названию.
+        """
+
+        self._refresh()
+        return [self.tag(i) for i in range(self.tag_count)]
+
+
+class TagRegistry:
+    """
+    Теги в памяти процесса в готовом к отдаче виде:
+    - ids_by_slug - соответствие слага и id для фильтрации рецептов
+    - content - отрендеренный JSON ответа /api/tags/
+    Пересобирается из снимка каталога при смене версии тегов.
+    """
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self._lock = threading.Lock()
+        self._version = None
+        self._ids_by_slug = {}
+        self._content = b"[]"
+
+    def _refresh(self):
+        version = versions.get_version(versions.TAGS)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    tags = self._snapshot.tags()
+                    self._ids_by_slug = {
+                        tag["slug"]: tag["id"] for tag in tags
+                    }
+                    self._content = JSONRenderer().render(tags)
+                    self._version = version
+
+    @property
+    def ids_by_slug(self):
+        self._refresh()
+        return self._ids_by_slug
+
+    @property
+    def content(self):
+        self._refresh()
+        return self._content
+
+    def choices(self):
+        return [(slug, slug) for slug in self.ids_by_slug]
+
+
+catalog = CatalogSnapshot()
+tag_registry = TagRegistry(catalog)
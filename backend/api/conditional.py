@@ -0,0 +1,63 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from api import versions
+from api.relations import relations_version_name
+
+
+class ConditionalGetMixin:
+    """
+    Поддержка условных GET-запросов (ETag) для действий list и retrieve.
+    ETag вычисляется по версиям моделей из кеша, поэтому ответ 304
+    отдаётся до выполнения запроса к базе. Last-Modified не отдаётся:
+    с точностью до секунды он не отличает изменения внутри одной
+    секунды, и If-Modified-Since вернул бы устаревший 304.
+    """
+
+    condition_versions = ()
+    personalized = False
+
+    def get_condition_versions(self, request):
+        """
+        Имена версий, от которых зависит ответ.
+        """
+
+        names = list(self.condition_versions)
+        if self.personalized and request.user.is_authenticated:
+            names.append(relations_version_name(request.user.pk))
+        return names
+
+    def get_etag(self, request):
+        """
+        Возвращает ETag для текущего запроса.
+        """
+
+        current = versions.get_versions(self.get_condition_versions(request))
+        parts = [
+            self.basename,
+            self.action,
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            str(request.user.pk if self.personalized else None),
+        ]
+        parts += [f"{name}={current[name]}" for name in sorted(current)]
+        digest = hashlib.sha1("\n".join(parts).encode()).hexdigest()
+        return f'"{digest}"'
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+        if self.personalized:
+            patch_vary_headers(response, ("Authorization",))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
@@ -5,5 +5,18 @@ MAX_LENGHT_TAG_NAME = 32
 MAX_LENGHT_INGREDIENT_MEASUREMENT_UNIT = 64
 MAX_LENGHT_INGREDIENT_NAME = 128
 DEFAULT_PAGE_SIZE = 6
+MAX_PAGE_SIZE = 100
 COOKING_TIME_MIN = AMOUNT_RECIPE_INGREDIENT_MIN = 1
 COOKING_TIME_MAX = AMOUNT_RECIPE_INGREDIENT_MAX = 32000
+INGREDIENT_SEARCH_LIMIT = 50
+SEARCH_CONFIG = "russian"
+SHOPPING_LIST_CHUNK_SIZE = 2000
+SHOPPING_LIST_FILENAME = "shopping_list"
+CART_TOTALS_BATCH_SIZE = 500
+IMAGE_VARIANT_SIZES = {"small": 320, "medium": 800}
+IMAGE_VARIANT_QUALITY = 80
+SHORT_CODE_MIN_LENGTH = 5
+SHORT_LINK_CACHE_SIZE = 10000
+SHORT_CODE_BATCH_SIZE = 1000
+BULK_MAX_ITEMS = 100
+BATCH_MAX_REQUESTS = 10
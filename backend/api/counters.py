@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from api import versions
+
+RECIPES_COUNT = "recipes_count"
+SUBSCRIBERS_COUNT = "subscribers_count"
+FAVORITES_COUNT = "favorites_count"
+IN_CART_COUNT = "in_cart_count"
+
+
+class CountersModelMixin:
+    """
+    Примесь для моделей с денормализованными счётчиками.
+    Обычный save() существующего объекта не перезаписывает счётчики
+    значениями, прочитанными ранее: они меняются только через
+    change_counter() и команду reconcile_counters.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get("update_fields") is None
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Меняет счётчик на delta одним UPDATE ... SET field = field + delta,
+    без чтения значения. Вызывается в той же транзакции,
+    что и изменение связи. Счётчик не опускается ниже нуля.
+    """
+
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """
+    То же для нескольких строк одним UPDATE.
+    Изменение числа добавлений в избранное меняет порядок
+    популярных рецептов, поэтому после фиксации транзакции
+    меняется и версия этого порядка.
+    """
+
+    if pks:
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(F(field) + delta, Value(0))}
+        )
+        if field == FAVORITES_COUNT:
+            transaction.on_commit(
+                lambda: versions.bump_version(versions.POPULARITY)
+            )
@@ -0,0 +1,111 @@
+import logging
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api import exports
+from food.models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+
+def _expires_at(moment):
+    return moment + timedelta(seconds=settings.EXPORT_JOB_TTL)
+
+
+def enqueue(request, export_format):
+    """
+    Ставит выгрузку списка покупок в очередь.
+    Если файл с таким содержимым уже есть в кеше выгрузок,
+    задача сразу создаётся выполненной.
+    """
+
+    now = timezone.now()
+    key = exports.export_key(request, export_format)
+    if os.path.exists(exports.export_path(key, export_format)):
+        return ExportJob.objects.create(
+            user=request.user,
+            export_format=export_format,
+            status=ExportJob.Status.DONE,
+            key=key,
+            started=now,
+            finished=now,
+            expires_at=_expires_at(now),
+        )
+    return ExportJob.objects.create(
+        user=request.user,
+        export_format=export_format,
+        expires_at=_expires_at(now),
+    )
+
+
+def claim(limit):
+    """
+    Забирает из очереди до limit задач и помечает их выполняемыми.
+    SKIP LOCKED позволяет нескольким воркерам разбирать очередь,
+    не блокируя друг друга и не получая одних и тех же задач.
+    """
+
+    with transaction.atomic():
+        ids = list(
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ExportJob.Status.PENDING)
+            .order_by("created")
+            .values_list("id", flat=True)[:limit]
+        )
+        ExportJob.objects.filter(id__in=ids).update(
+            status=ExportJob.Status.RUNNING, started=timezone.now()
+        )
+    return ids
+
+
+def run(job_id):
+    """
+    Выполняет задачу: строит файл по текущему содержимому корзины.
+    Воркер не видит версий рецептов из кеша веб-процессов, поэтому
+    не ищет готовый файл по ключу содержимого, а всегда строит
+    выгрузку заново под собственным ключом задачи.
+    """
+
+    job = ExportJob.objects.select_related("user").get(pk=job_id)
+    try:
+        key = uuid.uuid4().hex
+        path = exports.export_path(key, job.export_format)
+        exports.write_export(job.user, job.export_format, path)
+    except Exception as error:
+        logger.exception("Выгрузка %s не удалась", job_id)
+        now = timezone.now()
+        ExportJob.objects.filter(pk=job_id).update(
+            status=ExportJob.Status.FAILED,
+            error=str(error),
+            finished=now,
+            expires_at=_expires_at(now),
+        )
+        return
+    now = timezone.now()
+    ExportJob.objects.filter(pk=job_id).update(
+        status=ExportJob.Status.DONE,
+        key=key,
+        finished=now,
+        expires_at=_expires_at(now),
+    )
+
+
+def cleanup():
+    """
+    Удаляет истёкшие задачи и давно не запрашиваемые файлы,
+    возвращает в очередь задачи, зависшие из-за падения воркера.
+    """
+
+    now = timezone.now()
+    ExportJob.objects.filter(
+        status=ExportJob.Status.RUNNING,
+        started__lt=now - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT),
+    ).update(status=ExportJob.Status.PENDING, started=None)
+    expired, _ = ExportJob.objects.filter(expires_at__lt=now).delete()
+    removed = exports.prune_exports(settings.SHOPPING_LIST_EXPORT_TTL)
+    return expired, removed
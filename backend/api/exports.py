@@ -0,0 +1,240 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+
+from api import shopping_list, versions
+from api.fragments import recipe_version_name
+from food.models import ExportJob, ShoppingCart
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def content_key(export_format, recipe_ids):
+    """
+    Ключ выгрузки списка покупок, зависящий только от её содержимого:
+    формата, набора рецептов в корзине, их версий и версии ингредиентов.
+    Любое изменение корзины или рецептов в ней даёт новый ключ.
+    """
+
+    recipe_ids = sorted(recipe_ids)
+    names = [recipe_version_name(pk) for pk in recipe_ids]
+    current = versions.get_versions(names + [versions.INGREDIENTS])
+    parts = [export_format, current[versions.INGREDIENTS]]
+    parts += [f"{pk}:{current[name]}" for pk, name in zip(recipe_ids, names)]
+    return hashlib.sha256(
+        "|".join(map(str, parts)).encode()
+    ).hexdigest()
+
+
+def export_key(request, export_format):
+    """
+    Ключ выгрузки для текущего пользователя.
+    Состав корзины читается из базы одним запросом: закешированные
+    связи могут отставать, и тогда отдался бы файл другой корзины.
+    """
+
+    return content_key(
+        export_format,
+        ShoppingCart.objects.filter(user=request.user).values_list(
+            "recipe_id", flat=True
+        ),
+    )
+
+
+def export_path(key, export_format):
+    return os.path.join(
+        str(settings.SHOPPING_LIST_EXPORT_ROOT),
+        key[:2],
+        f"{key}.{export_format}",
+    )
+
+
+def _temporary_file(path):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    return tempfile.mkstemp(dir=directory, prefix=".export-")
+
+
+def save_export(path, content):
+    """
+    Атомарно записывает готовый файл выгрузки.
+    """
+
+    fd, tmp_path = _temporary_file(path)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def tee_export(path, chunks, encoding="utf-8"):
+    """
+    Отдаёт части выгрузки дальше и одновременно пишет их во временный
+    файл. Файл становится доступен под своим ключом только после
+    того, как выгрузка отдана целиком.
+    """
+
+    fd, tmp_path = _temporary_file(path)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            for chunk in chunks:
+                data = chunk.encode(encoding)
+                file.write(data)
+                yield data
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def write_export(user, export_format, path):
+    """
+    Строит выгрузку списка покупок пользователя и записывает её в path.
+    """
+
+    rows = shopping_list.iter_rows(user)
+    if export_format == ExportJob.Format.DOCX:
+        save_export(path, shopping_list.build_docx(rows).getvalue())
+        return
+    for _ in tee_export(path, shopping_list.TEXT_WRITERS[export_format](rows)):
+        pass
+
+
+def prune_exports(ttl):
+    """
+    Удаляет файлы выгрузок, к которым не обращались дольше ttl секунд.
+    Возвращает число удалённых файлов.
+    """
+
+    deadline = time.time() - ttl
+    removed = 0
+    root = str(settings.SHOPPING_LIST_EXPORT_ROOT)
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            try:
+                if os.stat(path).st_mtime < deadline:
+                    os.unlink(path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+    return removed
+
+
+def _parse_range(header, size):
+    """
+    Возвращает (начало, конец) из заголовка Range вида bytes=a-b.
+    None - заголовок не поддерживается и отдаётся весь файл,
+    ValueError - диапазон за пределами файла.
+    """
+
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        length = int(end)
+        if not length:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def _set_export_headers(response, etag, filename):
+    response["ETag"] = etag
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def serve_export(request, path, etag, content_type, filename):
+    """
+    Отдаёт сохранённую выгрузку с диска с поддержкой
+    If-None-Match (304) и одного диапазона Range (206).
+    """
+
+    size = os.path.getsize(path)
+    header = request.META.get("HTTP_RANGE")
+    if_range = request.META.get("HTTP_IF_RANGE")
+    byte_range = None
+    if header and (not if_range or if_range == etag):
+        try:
+            byte_range = _parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return _set_export_headers(response, etag, filename)
+
+    if byte_range is None:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+        return _set_export_headers(response, etag, filename)
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        _read_range(path, start, length),
+        status=206,
+        content_type=content_type,
+    )
+    response["Content-Length"] = str(length)
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return _set_export_headers(response, etag, filename)
+
+
+def cached_export(
+    request, export_format, content_type, filename, build, key=None
+):
+    """
+    Выгрузка списка покупок через кеш на диске.
+    build(path) вызывается только при промахе; он либо записывает файл
+    и возвращает None, либо возвращает ответ, который сам
+    сохранит файл по мере отдачи. Без build при промахе
+    возвращается None.
+    """
+
+    key = key or export_key(request, export_format)
+    etag = f'"{key}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+        return response
+
+    path = export_path(key, export_format)
+    try:
+        # Время последнего обращения - для prune_exports.
+        os.utime(path)
+    except FileNotFoundError:
+        if build is None:
+            return None
+        response = build(path)
+        if response is not None:
+            response["Content-Type"] = content_type
+            return _set_export_headers(response, etag, filename)
+    return serve_export(request, path, etag, content_type, filename)
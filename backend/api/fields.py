@@ -0,0 +1,129 @@
+import uuid
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+
+class ContextDefault:
+    """
+    Значение по умолчанию из контекста сериализатора,
+    по аналогии с CurrentUserDefault. Позволяет передать объект,
+    уже загруженный представлением, без повторного запроса.
+    """
+
+    requires_context = True
+
+    def __init__(self, key):
+        self.key = key
+
+    def __call__(self, serializer_field):
+        return serializer_field.context[self.key]
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.key!r})"
+
+
+class ImageVariantField(serializers.Field):
+    """
+    Ссылки на уменьшенную копию изображения одного размера:
+    {"webp": url, "jpeg": url}, или None, пока копии не построены.
+    Без запроса в контексте ссылки относительные.
+    """
+
+    def __init__(
+        self,
+        size,
+        image_field="image",
+        variants_field="image_variants",
+        **kwargs,
+    ):
+        self.size = size
+        self.image_field = image_field
+        self.variants_field = variants_field
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        image = getattr(instance, self.image_field)
+        variants = getattr(instance, self.variants_field) or {}
+        if not image or variants.get("source") != image.name:
+            return None
+        request = self.context.get("request")
+        urls = {}
+        for extension, name in variants.get(self.size, {}).items():
+            url = default_storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[extension] = url
+        return urls
+
+
+class ImageUploadField(Base64ImageField):
+    """
+    Изображение в виде base64-строки или файла из multipart/form-data.
+    Загруженный файл уже лежит во временном файле на диске и проверяется
+    Pillow прямо оттуда, без чтения целиком в память.
+    Имя файла, как и для base64, генерируется заново.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, UploadedFile):
+            return super().to_internal_value(data)
+        image = serializers.ImageField.to_internal_value(self, data)
+        extension = image.image.format.lower()
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        image.name = f"{uuid.uuid4()}.{extension}"
+        return image
+
+
+def check_ids(queryset, ids, message, known_ids=None):
+    """
+    Проверяет, что все ids есть в queryset, одним запросом id__in.
+    Если передан known_ids, id из него считаются существующими
+    без запроса. Все отсутствующие id перечисляются в одной ошибке.
+    """
+
+    unknown = set(ids) - set(known_ids() if known_ids else ())
+    if unknown:
+        unknown -= set(
+            queryset.filter(pk__in=unknown)
+            .order_by()
+            .values_list("pk", flat=True)
+        )
+    if unknown:
+        raise serializers.ValidationError(
+            message.format(ids=", ".join(map(str, sorted(unknown))))
+        )
+
+
+class PrimaryKeysField(serializers.ListField):
+    """
+    Список id объектов queryset. В отличие от
+    PrimaryKeyRelatedField(many=True), который читает каждый объект
+    отдельным запросом, все id проверяются разом через check_ids.
+    Возвращает список id.
+    """
+
+    default_error_messages = {
+        "does_not_exist": "Объекты с id {ids} не найдены.",
+    }
+
+    def __init__(self, queryset, known_ids=None, **kwargs):
+        self.queryset = queryset
+        self.known_ids = known_ids
+        kwargs.setdefault("child", serializers.IntegerField(min_value=1))
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        check_ids(
+            self.queryset.all(),
+            ids,
+            self.error_messages["does_not_exist"],
+            self.known_ids,
+        )
+        return ids
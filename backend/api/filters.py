@@ -1,8 +1,21 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db.models import BooleanField, Case, F, Q, Value, When
+from django.db.models.functions import Lower, Upper
 from django_filters.rest_framework import FilterSet, filters
 
+from api import constants
+from api.catalog import tag_registry
 from food import models
 
 
+def tag_choices():
+    return tag_registry.choices()
+
+
 class RecipeFilter(FilterSet):
     """
     Фильтр для рецептов с возможностью фильтрации по:
@@ -10,15 +23,16 @@ class RecipeFilter(FilterSet):
     - тегам
     - наличию в списке покупок
     - наличию в избранном
+    - словам из названия и описания (полнотекстовый поиск)
+    и сортировкой по популярности (popular)
     """
 
     author = filters.CharFilter(
         field_name='author__id',
     )
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=models.Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags',
     )
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_shopping_cart_recipes',
@@ -26,6 +40,12 @@ class RecipeFilter(FilterSet):
     is_favorited = filters.BooleanFilter(
         method='filter_favorite_recipes',
     )
+    search = filters.CharFilter(
+        method='filter_search',
+    )
+    popular = filters.BooleanFilter(
+        method='filter_popular',
+    )
 
     class Meta:
         model = models.Recipe
@@ -34,8 +54,22 @@ class RecipeFilter(FilterSet):
             'tags',
             'is_in_shopping_cart',
             'is_favorited',
+            'search',
+            'popular',
         )
 
+    def filter_tags(self, queryset, name, value):
+        """
+        Фильтрует рецепты по слагам тегов.
+        Слаги проверяются и переводятся в id по реестру тегов.
+        """
+
+        if not value:
+            return queryset
+        ids_by_slug = tag_registry.ids_by_slug
+        ids = [ids_by_slug[slug] for slug in value if slug in ids_by_slug]
+        return queryset.filter(tags__id__in=ids).distinct()
+
     def filter_shopping_cart_recipes(self, queryset, name, value):
         """
         Фильтрует рецепты по их наличию в списке покупок пользователя.
@@ -56,18 +90,72 @@ class RecipeFilter(FilterSet):
             return queryset.filter(favorite__user=user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию и описанию рецепта.
+        Результаты упорядочены по релевантности.
+        """
+
+        if not value.strip():
+            return queryset
+        query = SearchQuery(
+            value,
+            config=constants.SEARCH_CONFIG,
+            search_type='websearch',
+        )
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query),
+        ).order_by('-rank', '-pub_date', '-id')
+
+    def filter_popular(self, queryset, name, value):
+        """
+        Сортирует рецепты по числу добавлений в избранное.
+        """
+
+        if value:
+            return queryset.order_by('-favorites_count', '-pub_date', '-id')
+        return queryset
+
 
 class IngredientSearchFilter(FilterSet):
     """
     Фильтр для поиска ингредиентов по названию.
-    Поддерживает поиск по начальным буквам (case-insensitive).
+    Поддерживает поиск по начальным буквам (case-insensitive)
+    и поиск по подстроке с учётом опечаток (search).
     """
 
     name = filters.CharFilter(
         field_name='name',
         lookup_expr='istartswith',
     )
+    search = filters.CharFilter(
+        method='filter_search',
+    )
 
     class Meta:
         model = models.Ingredient
-        fields = ('name',)
+        fields = ('name', 'search')
+
+    def filter_search(self, queryset, name, value):
+        """
+        Ищет ингредиенты по подстроке и триграммному сходству.
+        Сначала идут совпадения по началу названия,
+        затем - по убыванию сходства.
+        """
+
+        value = value.strip()
+        if not value:
+            return queryset
+        return queryset.alias(
+            upper_name=Upper('name'),
+        ).filter(
+            Q(name__icontains=value)
+            | Q(upper_name__trigram_similar=value.upper())
+        ).annotate(
+            is_prefix=Case(
+                When(name__istartswith=value, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+            similarity=TrigramSimilarity(Upper('name'), value.upper()),
+        ).order_by('-is_prefix', '-similarity', Lower('name'), 'id')
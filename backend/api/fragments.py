@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from api import versions
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+def recipe_version_name(recipe_id):
+    return f"recipe:{recipe_id}"
+
+
+def user_version_name(user_id):
+    return f"user:{user_id}"
+
+
+def bump_recipe(recipe_id):
+    """
+    Делает недействительным закешированное представление рецепта
+    после фиксации транзакции: иначе параллельный запрос успеет
+    закешировать старые данные под новой версией.
+    """
+
+    transaction.on_commit(
+        lambda: versions.bump_version(
+            recipe_version_name(recipe_id), versions.RECIPES
+        )
+    )
+
+
+def bump_user(user_id):
+    """
+    Делает недействительными представления всех рецептов автора
+    после фиксации транзакции.
+    """
+
+    transaction.on_commit(
+        lambda: versions.bump_version(
+            user_version_name(user_id), versions.USERS
+        )
+    )
+
+
+def get_recipe_fragments(recipes, build):
+    """
+    Возвращает {id рецепта: общая для всех пользователей часть
+    представления}. Отсутствующие в кеше фрагменты строятся функцией
+    build и сохраняются в кеш под ключом из версий рецепта, автора,
+    тегов и ингредиентов.
+    """
+
+    names = {versions.TAGS, versions.INGREDIENTS}
+    for recipe in recipes:
+        names.add(recipe_version_name(recipe.pk))
+        names.add(user_version_name(recipe.author_id))
+    current = versions.get_versions(names)
+    common = (
+        f"{current[versions.TAGS]}:{current[versions.INGREDIENTS]}"
+    )
+    keys = {
+        recipe.pk: (
+            f"recipe-fragment:{recipe.pk}:"
+            f"{current[recipe_version_name(recipe.pk)]}:"
+            f"{current[user_version_name(recipe.author_id)]}:{common}"
+        )
+        for recipe in recipes
+    }
+
+    cached = cache.get_many(keys.values())
+    fragments = {}
+    missing = {}
+    for recipe in recipes:
+        key = keys[recipe.pk]
+        if key in cached:
+            fragments[recipe.pk] = cached[key]
+        else:
+            fragments[recipe.pk] = missing[key] = build(recipe)
+    if missing:
+        cache.set_many(missing, FRAGMENT_TIMEOUT)
+    return fragments
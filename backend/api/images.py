@@ -0,0 +1,229 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from api import constants, media
+from food.storage import lock_names
+
+logger = logging.getLogger(__name__)
+
+# Расширение файла и формат Pillow для каждого вида уменьшенной копии.
+FORMATS = {
+    "webp": "WEBP",
+    "jpeg": "JPEG",
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix="images"
+)
+# Файлы, копии которых уже строятся в этом процессе, и признак того,
+# что за время построения на файл сослались новые строки.
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def variant_name(name, size, extension):
+    stem, _ = os.path.splitext(name)
+    return f"{stem}_{size}.{extension}"
+
+
+def _encode(image, pil_format):
+    if pil_format == "JPEG" and image.mode != "RGB":
+        background = Image.new("RGB", image.size, "white")
+        alpha = image.convert("RGBA")
+        background.paste(alpha, mask=alpha.getchannel("A"))
+        image = background
+    buffer = BytesIO()
+    image.save(
+        buffer, pil_format, quality=constants.IMAGE_VARIANT_QUALITY
+    )
+    return buffer.getvalue()
+
+
+def build_variants(name, storage=default_storage):
+    """
+    Декодирует исходное изображение и сохраняет рядом с ним
+    уменьшенные копии всех размеров в WebP и JPEG.
+    Возвращает {"source": исходный файл, размер: {формат: файл}}.
+    """
+
+    with storage.open(name, "rb") as file:
+        with Image.open(file) as original:
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    variants = {"source": name}
+    for size, side in constants.IMAGE_VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((side, side), Image.LANCZOS)
+        variants[size] = {}
+        for extension, pil_format in FORMATS.items():
+            variants[size][extension] = storage.save(
+                variant_name(name, size, extension),
+                ContentFile(_encode(resized, pil_format)),
+            )
+    return variants
+
+
+def process(model, name, image_field, variants_field, on_done, force=False):
+    """
+    Строит уменьшенные копии файла name и записывает их во все строки
+    model, ссылающиеся на этот файл. Если копии уже построены
+    для другой строки, они переиспользуются без декодирования.
+    on_done(pk) вызывается для каждой обновлённой строки.
+    """
+
+    try:
+        rows = model.objects.filter(**{image_field: name})
+        variants = None
+        if not force:
+            variants = rows.filter(
+                **{f"{variants_field}__source": name}
+            ).values_list(variants_field, flat=True).first()
+        if variants is None:
+            # Декодирование и запись файлов идут без блокировок строк.
+            variants = build_variants(name)
+        with transaction.atomic():
+            names = media.variant_names(variants)
+            lock_names(names)
+            if not all(map(default_storage.exists, names)):
+                # Сборщик успел удалить копии, на которые никто
+                # не ссылался: записываем их заново под той же блокировкой.
+                variants = build_variants(name)
+            # Блокируются только строки, которые действительно меняются.
+            changed = list(
+                rows.select_for_update()
+                .exclude(**{variants_field: variants})
+                .order_by("pk")
+                .values_list("pk", variants_field)
+            )
+            model.objects.filter(pk__in=[pk for pk, _ in changed]).update(
+                **{variants_field: variants}
+            )
+            for _, row_variants in changed:
+                media.change_files(
+                    media.variant_names(row_variants),
+                    media.variant_names(variants),
+                )
+        for pk, _ in changed:
+            on_done(pk)
+        return len(changed)
+    except Exception:
+        logger.exception("Не удалось построить копии изображения %s", name)
+        return 0
+    finally:
+        # Задача выполняется в потоке пула со своим соединением.
+        connection.close()
+
+
+def _shared_key(name):
+    return f"image-variants:{name}"
+
+
+def build_shared_variants(model, image_field, variants_field, on_done):
+    """
+    Строит копии общих файлов по умолчанию (аватар по умолчанию)
+    и запоминает их, чтобы новые строки получали готовые копии.
+    Вызывается при развёртывании командой build_image_variants,
+    при сохранении строк такие файлы не обрабатываются.
+    Возвращает число обновлённых строк.
+    """
+
+    updated = 0
+    for name in media.PROTECTED:
+        try:
+            variants = build_variants(name)
+        except OSError:
+            logger.warning("Нет файла по умолчанию %s", name)
+            continue
+        cache.set(_shared_key(name), variants, None)
+        updated += process(model, name, image_field, variants_field, on_done)
+    return updated
+
+
+def copy_shared_variants(instance, image_field, variants_field, update_fields):
+    """
+    Обработчик pre_save: строке с общим файлом по умолчанию
+    проставляет уже построенные копии этого файла.
+    """
+
+    if update_fields is not None and variants_field not in update_fields:
+        return
+    name = getattr(instance, image_field).name
+    variants = getattr(instance, variants_field) or {}
+    if name not in media.PROTECTED or variants.get("source") == name:
+        return
+    variants = cache.get(_shared_key(name))
+    if variants is None:
+        variants = type(instance).objects.filter(
+            **{image_field: name, f"{variants_field}__source": name}
+        ).values_list(variants_field, flat=True).first()
+        if variants is None:
+            return
+        cache.set(_shared_key(name), variants, None)
+    if all(map(default_storage.exists, media.variant_names(variants))):
+        setattr(instance, variants_field, variants)
+
+
+def _process_pending(model, name, image_field, variants_field, on_done):
+    key = (model, name)
+    try:
+        while True:
+            process(model, name, image_field, variants_field, on_done)
+            with _pending_lock:
+                if not _pending[key]:
+                    del _pending[key]
+                    return
+                _pending[key] = False
+    except BaseException:
+        with _pending_lock:
+            _pending.pop(key, None)
+        raise
+
+
+def _submit(model, name, image_field, variants_field, on_done):
+    key = (model, name)
+    with _pending_lock:
+        if key in _pending:
+            # Повторный проход подхватит новые строки
+            # и переиспользует уже построенные копии.
+            _pending[key] = True
+            return
+        _pending[key] = False
+    executor.submit(
+        _process_pending, model, name, image_field, variants_field, on_done
+    )
+
+
+def schedule(instance, image_field, variants_field, on_done):
+    """
+    После фиксации транзакции ставит построение уменьшенных копий
+    в пул потоков, если изображение объекта изменилось.
+    Запрос не ждёт декодирования и масштабирования.
+    Копии общих файлов по умолчанию строятся только при развёртывании
+    (build_shared_variants), иначе каждая регистрация обходила бы
+    строки всех пользователей с аватаром по умолчанию.
+    """
+
+    name = getattr(instance, image_field).name
+    variants = getattr(instance, variants_field) or {}
+    if (
+        not name
+        or name in media.PROTECTED
+        or variants.get("source") == name
+    ):
+        return
+    model = type(instance)
+    transaction.on_commit(
+        lambda: _submit(model, name, image_field, variants_field, on_done)
+    )
@@ -0,0 +1,88 @@
+from django.db import connection
+
+# Результаты пакетных операций со связями для каждого id.
+ADDED = "added"
+EXISTS = "exists"
+REMOVED = "removed"
+NOT_FOUND = "not_found"
+INVALID = "invalid"
+
+
+def lock_targets(model, pks):
+    """
+    Блокирует строки model с данными pk до конца транзакции
+    в порядке pk, чтобы параллельные запросы не взаимоблокировались.
+    Возвращает множество pk существующих строк.
+    """
+
+    return set(
+        model.objects.select_for_update()
+        .filter(pk__in=pks)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def insert_links(model, owner_field, owner_id, target_field, target_ids):
+    """
+    Вставляет связи (owner_id, target_id) одним запросом
+    INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    Уже существующие связи пропускаются уникальным ограничением,
+    в том числе при параллельных запросах. Возвращает множество
+    target_id, связи с которыми действительно были добавлены.
+    """
+
+    opts = model._meta
+    quote = connection.ops.quote_name
+    owner = quote(opts.get_field(owner_field).column)
+    target = quote(opts.get_field(target_field).column)
+    sql = (
+        f"INSERT INTO {quote(opts.db_table)} ({owner}, {target}) "
+        f"SELECT %s, target FROM unnest(%s::bigint[]) AS target "
+        f"ON CONFLICT DO NOTHING RETURNING {target}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [owner_id, list(target_ids)])
+        return {row[0] for row in cursor.fetchall()}
+
+
+def insert_link(model, owner_field, owner_id, target_field, target_id):
+    """
+    Добавляет одну связь. True, если её ещё не было.
+    """
+
+    return bool(
+        insert_links(model, owner_field, owner_id, target_field, [target_id])
+    )
+
+
+def delete_links(model, owner_field, owner_id, target_field, target_ids):
+    """
+    Удаляет связи владельца с target_ids одним запросом
+    DELETE ... RETURNING. Возвращает множество target_id,
+    связи с которыми действительно были удалены.
+    У моделей связей нет сигналов удаления, поэтому
+    обход Django-удаления ничего не пропускает.
+    """
+
+    opts = model._meta
+    quote = connection.ops.quote_name
+    owner = quote(opts.get_field(owner_field).column)
+    target = quote(opts.get_field(target_field).column)
+    sql = (
+        f"DELETE FROM {quote(opts.db_table)} "
+        f"WHERE {owner} = %s AND {target} = ANY(%s::bigint[]) "
+        f"RETURNING {target}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [owner_id, list(target_ids)])
+        return {row[0] for row in cursor.fetchall()}
+
+
+def results(ids, statuses, default):
+    """
+    Результат пакетной операции в порядке запроса:
+    [{"id": id, "status": статус}].
+    """
+
+    return [{"id": pk, "status": statuses.get(pk, default)} for pk in ids]
@@ -0,0 +1,216 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from api import constants
+from food.models import MediaFile
+from food.storage import lock_names
+
+User = get_user_model()
+
+# Общие файлы по умолчанию не учитываются и не удаляются никогда.
+PROTECTED = frozenset(
+    field.default
+    for field in (User._meta.get_field("avatar"),)
+    if isinstance(field.default, str)
+)
+
+
+def variant_names(variants):
+    """
+    Файлы уменьшенных копий из значения поля *_variants.
+    """
+
+    variants = variants or {}
+    names = []
+    for size in constants.IMAGE_VARIANT_SIZES:
+        names += (variants.get(size) or {}).values()
+    return [name for name in names if name]
+
+
+def file_names(instance, image_field, variants_field):
+    """
+    Все файлы объекта: исходная картинка и её уменьшенные копии.
+    Одна строка может ссылаться на файл несколько раз.
+    """
+
+    return _row_names(
+        getattr(instance, image_field).name,
+        getattr(instance, variants_field),
+    )
+
+
+def _row_names(image, variants):
+    return [name for name in [image, *variant_names(variants)] if name]
+
+
+def stored_files(instance, image_field, variants_field, fields=None):
+    """
+    Файлы, на которые строка объекта ссылается в базе данных.
+    Внутри транзакции строка блокируется до её конца, чтобы
+    построение уменьшенных копий не поменяло ссылки параллельно.
+    """
+
+    fields = {image_field, variants_field} if fields is None else fields
+    if not fields or instance._state.adding or instance.pk is None:
+        return []
+    rows = type(instance).objects.filter(pk=instance.pk)
+    if connection.in_atomic_block:
+        rows = rows.select_for_update()
+    row = rows.values(*fields).first()
+    if row is None:
+        return []
+    return _row_names(row.get(image_field), row.get(variants_field))
+
+
+def remember_files(instance, image_field, variants_field, update_fields):
+    """
+    Обработчик pre_save: запоминает прежние ссылки строки
+    на файлы для сохраняемых полей.
+    """
+
+    fields = {image_field, variants_field}
+    if update_fields is not None:
+        fields &= set(update_fields)
+    instance._media_fields = fields
+    instance._media_files = stored_files(
+        instance, image_field, variants_field, fields
+    )
+
+
+def update_files(instance, image_field, variants_field):
+    """
+    Обработчик post_save: учитывает замену ссылок строки на файлы.
+    """
+
+    fields = instance.__dict__.pop(
+        "_media_fields", {image_field, variants_field}
+    )
+    old_names = instance.__dict__.pop("_media_files", [])
+    change_files(
+        old_names,
+        _row_names(
+            getattr(instance, image_field).name
+            if image_field in fields else None,
+            getattr(instance, variants_field)
+            if variants_field in fields else None,
+        ),
+    )
+
+
+def release_stored(instance, image_field, variants_field):
+    """
+    Обработчик pre_delete: освобождает файлы удаляемой строки.
+    """
+
+    release(stored_files(instance, image_field, variants_field))
+
+
+def _counted(names):
+    counts = Counter(names)
+    for name in PROTECTED:
+        counts.pop(name, None)
+    return counts
+
+
+def _change_references(names, sql):
+    counts = _counted(names)
+    if not counts:
+        return
+    table = connection.ops.quote_name(MediaFile._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql.format(table=table),
+            [list(counts), list(counts.values())],
+        )
+
+
+def acquire(names):
+    """
+    Увеличивает счётчики ссылок на файлы одним
+    INSERT ... ON CONFLICT DO UPDATE.
+    Вызывается в той же транзакции, что и запись ссылок.
+    """
+
+    _change_references(
+        names,
+        "INSERT INTO {table} (name, references_count) "
+        "SELECT * FROM unnest(%s::varchar[], %s::integer[]) "
+        "ON CONFLICT (name) DO UPDATE SET references_count = "
+        "{table}.references_count + EXCLUDED.references_count",
+    )
+
+
+def release(names):
+    """
+    Уменьшает счётчики ссылок на файлы в текущей транзакции,
+    а после её фиксации удаляет файлы, на которые больше
+    не ссылается ни одна строка.
+    """
+
+    _change_references(
+        names,
+        "UPDATE {table} SET references_count = "
+        "GREATEST({table}.references_count - released.count, 0) "
+        "FROM unnest(%s::varchar[], %s::integer[]) "
+        "AS released (name, count) WHERE {table}.name = released.name",
+    )
+    names = list(_counted(names))
+    if names:
+        transaction.on_commit(lambda: collect(names))
+
+
+def change_files(old_names, new_names):
+    """
+    Учитывает замену ссылок строки: old_names на new_names.
+    """
+
+    old, new = Counter(old_names), Counter(new_names)
+    acquire(list((new - old).elements()))
+    release(list((old - new).elements()))
+
+
+def collect(names, storage=default_storage):
+    """
+    Удаляет файлы с нулевым счётчиком ссылок.
+    Каждый файл проверяется под той же блокировкой, под которой
+    хранилище его записывает, поэтому файл, только что
+    переиспользованный незафиксированной загрузкой, не удаляется.
+    Возвращает число удалённых файлов.
+    """
+
+    removed = 0
+    for name in set(names) - PROTECTED:
+        with transaction.atomic():
+            lock_names([name])
+            referenced = MediaFile.objects.filter(
+                name=name, references_count__gt=0
+            ).exists()
+            if referenced:
+                continue
+            MediaFile.objects.filter(name=name).delete()
+            if storage.exists(name):
+                storage.delete(name)
+                removed += 1
+    return removed
+
+
+def replace_files(instance, image_field, variants_field, old_files):
+    """
+    Вызывается после сохранения объекта с новой картинкой.
+    Если файл действительно сменился, сбрасывает старые уменьшенные
+    копии и освобождает их. Сама картинка учитывается сигналами
+    сохранения модели. Та же картинка хранится под тем же именем
+    и ничего не меняет.
+    """
+
+    name = getattr(instance, image_field).name
+    if old_files and old_files[0] == name:
+        return
+    type(instance).objects.filter(pk=instance.pk).update(
+        **{variants_field: {}}
+    )
+    release(variant_names(getattr(instance, variants_field)))
+    setattr(instance, variants_field, {})
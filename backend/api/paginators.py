@@ -1,14 +1,216 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 from api import constants as app_constants
 
 
+class CursorPaginator(CursorPagination):
+    """
+    Курсорный (keyset) пагинатор:
+    - страницы выбираются по индексу, без OFFSET и COUNT(*)
+    - токены next/previous непрозрачны для клиента
+    - позиция курсора содержит значения всех полей ordering,
+      поэтому при совпадении первого поля (например, pub_date)
+      следующая страница выбирается по остальным, а не через OFFSET
+    """
+
+    page_size = app_constants.DEFAULT_PAGE_SIZE
+    page_size_query_param = "limit"
+    max_page_size = app_constants.MAX_PAGE_SIZE
+    position_separator = "|"
+    _strip_position = False
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if self._strip_position and cursor is not None:
+            # Позицию фильтрует paginate_queryset по всем полям,
+            # базовый класс видит только смещение и направление.
+            return cursor._replace(position=None)
+        return cursor
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            name = order.lstrip("-")
+            if isinstance(instance, dict):
+                values.append(instance[name])
+            else:
+                values.append(getattr(instance, name))
+        return self.position_separator.join(map(str, values))
+
+    def _parse_position(self, queryset, ordering, position):
+        values = position.split(self.position_separator, len(ordering) - 1)
+        if len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        parsed = []
+        for order, value in zip(ordering, values):
+            name = order.lstrip("-")
+            annotation = queryset.query.annotations.get(name)
+            if annotation is not None:
+                field = annotation.output_field
+            else:
+                field = queryset.model._meta.get_field(name)
+            try:
+                parsed.append(field.to_python(value))
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+        return parsed
+
+    def _after_position(self, ordering, values, reverse):
+        """
+        Условие «строка после позиции» в порядке ordering:
+        (a < x) OR (a = x AND b < y) OR ... с учётом направления
+        каждого поля и направления курсора.
+        """
+
+        condition = Q()
+        equal = Q()
+        for order, value in zip(ordering, values):
+            name = order.lstrip("-")
+            lookup = "lt" if order.startswith("-") != reverse else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor = self.decode_cursor(request)
+        position = cursor.position if cursor is not None else None
+        if position is not None:
+            ordering = self.get_ordering(request, queryset, view)
+            queryset = queryset.filter(
+                self._after_position(
+                    ordering,
+                    self._parse_position(queryset, ordering, position),
+                    cursor.reverse,
+                )
+            )
+        self._strip_position = True
+        try:
+            page = super().paginate_queryset(queryset, request, view)
+        finally:
+            self._strip_position = False
+        if position is not None:
+            # Восстанавливаем то, что базовый класс вывел бы
+            # из позиции курсора.
+            self.cursor = cursor
+            if cursor.reverse:
+                self.has_next = True
+                self.next_position = position
+            else:
+                self.has_previous = True
+                self.previous_position = position
+            if self.template is not None:
+                self.display_page_controls = True
+        return page
+
+
+class RecipeCursorPaginator(CursorPaginator):
+    """
+    Курсорный пагинатор рецептов. Позиция строится по сортировке,
+    которую задали фильтры (например, popular), а без неё -
+    по стабильному порядку (pub_date, id).
+    """
+
+    ordering = ("-pub_date", "-id")
+
+    def get_ordering(self, request, queryset, view):
+        ordering = queryset.query.order_by
+        if ordering and all(isinstance(order, str) for order in ordering):
+            return tuple(ordering)
+        return self.ordering
+
+
+class SubscriptionCursorPaginator(CursorPaginator):
+    """
+    Курсорный пагинатор подписок в порядке оформления подписки.
+    Queryset должен быть аннотирован полем subscription_id.
+    """
+
+    ordering = ("-subscription_id",)
+
+
 class Paginator(PageNumberPagination):
     """
     Кастомный пагинатор для API с возможностью:
     - установки размера страницы по умолчанию из констант
     - динамического изменения размера страницы через параметр limit
+    - переключения в курсорный режим через параметр paginate=cursor
+      (если задан cursor_paginator_class)
     """
 
     page_size = app_constants.DEFAULT_PAGE_SIZE
     page_size_query_param = "limit"
+    cursor_paginator_class = None
+    cursor_paginator = None
+    cursor_unsupported_params = ()
+    mode_query_param = "paginate"
+    cursor_mode = "cursor"
+
+    def get_cursor_paginator(self, request):
+        """
+        Возвращает курсорный пагинатор, если клиент запросил курсорный
+        режим или уже передал курсор. Параметры, сортировку которых
+        курсор не может воспроизвести, в этом режиме отклоняются.
+        """
+
+        if self.cursor_paginator_class is None:
+            return None
+        params = request.query_params
+        if not (
+            params.get(self.mode_query_param) == self.cursor_mode
+            or self.cursor_paginator_class.cursor_query_param in params
+        ):
+            return None
+        unsupported = [
+            name for name in self.cursor_unsupported_params if name in params
+        ]
+        if unsupported:
+            raise serializers.ValidationError({
+                name: "Не поддерживается в курсорном режиме."
+                for name in unsupported
+            })
+        return self.cursor_paginator_class()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = self.get_cursor_paginator(request)
+        if self.cursor_paginator is not None:
+            page = self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+            self.display_page_controls = (
+                self.cursor_paginator.display_page_controls
+            )
+            return page
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.to_html()
+        return super().to_html()
+
+
+class RecipePaginator(Paginator):
+    """
+    Пагинатор рецептов с опциональным курсорным режимом.
+    Поиск сортирует по вещественному рангу, который нельзя точно
+    сравнить со значением из курсора, поэтому с курсором не сочетается.
+    """
+
+    cursor_paginator_class = RecipeCursorPaginator
+    cursor_unsupported_params = ("search",)
+
+
+class SubscriptionPaginator(Paginator):
+    """
+    Пагинатор подписок с опциональным курсорным режимом.
+    """
+
+    cursor_paginator_class = SubscriptionCursorPaginator
@@ -0,0 +1,120 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from api import versions
+from food.models import Favorite, ShoppingCart
+from users.models import Sub
+
+FAVORITES = "favorites"
+SHOPPING_CART = "shopping_cart"
+SUBSCRIPTIONS = "subscriptions"
+
+RELATIONS_TIMEOUT = 60 * 60 * 24
+
+LOADERS = {
+    FAVORITES: lambda user_id: Favorite.objects.filter(
+        user_id=user_id
+    ).values_list("recipe_id", flat=True),
+    SHOPPING_CART: lambda user_id: ShoppingCart.objects.filter(
+        user_id=user_id
+    ).values_list("recipe_id", flat=True),
+    SUBSCRIPTIONS: lambda user_id: Sub.objects.filter(
+        user_id=user_id
+    ).values_list("author_id", flat=True),
+}
+
+
+class UserRelations:
+    """
+    Множества id, связанных с пользователем:
+    - favorites - рецепты в избранном
+    - shopping_cart - рецепты в списке покупок
+    - subscriptions - авторы, на которых он подписан
+    """
+
+    def __init__(self, user_id=None, **relations):
+        self.user_id = user_id
+        for kind in LOADERS:
+            setattr(self, kind, relations.get(kind, frozenset()))
+
+
+ANONYMOUS_RELATIONS = UserRelations()
+
+
+def relations_version_name(user_id):
+    return f"relations:{user_id}"
+
+
+def _cache_key(user_id, kind, version):
+    return f"relations:{user_id}:{kind}:{version}"
+
+
+def _load(user_id, kind):
+    return frozenset(LOADERS[kind](user_id))
+
+
+def load_relations(user_id):
+    """
+    Читает связи пользователя из кеша, недостающие подгружает из базы
+    и записывает в кеш. Ключи содержат версию связей пользователя:
+    после изменения связей старые значения просто перестают читаться,
+    а запоздавшая запись прочитанного раньше набора попадает
+    под уже устаревший ключ.
+    """
+
+    version = versions.get_version(relations_version_name(user_id))
+    keys = {kind: _cache_key(user_id, kind, version) for kind in LOADERS}
+    cached = cache.get_many(keys.values())
+    relations = {}
+    missing = {}
+    for kind, key in keys.items():
+        if key in cached:
+            relations[kind] = cached[key]
+        else:
+            relations[kind] = missing[key] = _load(user_id, kind)
+    if missing:
+        cache.set_many(missing, RELATIONS_TIMEOUT)
+    return UserRelations(user_id, **relations)
+
+
+def get_user_relations(request):
+    """
+    Возвращает связи текущего пользователя.
+    Результат запоминается на время обработки запроса.
+    """
+
+    if request is None or not request.user.is_authenticated:
+        return ANONYMOUS_RELATIONS
+    http_request = getattr(request, "_request", request)
+    relations = getattr(http_request, "user_relations", None)
+    if relations is None or relations.user_id != request.user.pk:
+        relations = load_relations(request.user.pk)
+        http_request.user_relations = relations
+    return relations
+
+
+def relations_changed(user_id):
+    """
+    После фиксации транзакции меняет версию связей пользователя:
+    закешированные наборы и ответы с ними становятся недействительными.
+    """
+
+    transaction.on_commit(
+        lambda: versions.bump_version(relations_version_name(user_id))
+    )
+
+
+def refresh_relation(request, kind):
+    """
+    Вызывается после изменения связи текущим пользователем.
+    Кеш не перезаписывается: меняется версия связей, и следующее
+    чтение загрузит их из базы. Связи, запомненные на время запроса,
+    перечитываются из базы сразу.
+    """
+
+    user_id = request.user.pk
+    relations_changed(user_id)
+    http_request = getattr(request, "_request", request)
+    relations = getattr(http_request, "user_relations", None)
+    if relations is not None and relations.user_id == user_id:
+        setattr(relations, kind, _load(user_id, kind))
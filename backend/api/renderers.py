@@ -0,0 +1,48 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Рендерер формата выгрузки.
+    Нужен для согласования формата (?format= и заголовок Accept):
+    сам файл представление отдаёт готовым ответом,
+    а через рендерер проходят только ошибки.
+    """
+
+    charset = "utf-8"
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f"{self.media_type}; charset={self.charset}"
+        return self.media_type
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return JSONRenderer().render(data)
+
+
+class PlainTextRenderer(ExportRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class DocxRenderer(ExportRenderer):
+    media_type = (
+        "application/vnd.openxmlformats-officedocument."
+        "wordprocessingml.document"
+    )
+    format = "docx"
+    charset = None
+
+
+EXPORT_RENDERERS = {
+    renderer.format: renderer
+    for renderer in (DocxRenderer, PlainTextRenderer, CSVRenderer)
+}
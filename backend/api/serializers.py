@@ -1,4 +1,9 @@
+import json
+
 from django.contrib.auth import get_user_model
+from django.db import models
+from django.http import QueryDict
+from django.urls import reverse
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework.fields import SerializerMethodField
@@ -10,8 +15,21 @@ from food.models import (
     ShoppingCart,
     RecipeIngredient,
     Favorite,
+    ExportJob,
+    ShoppingCartIngredient,
 )
 from users.models import Sub
+from api import cart_totals, constants, links, media
+from api.catalog import tag_registry
+from api.fields import (
+    ContextDefault,
+    ImageUploadField,
+    ImageVariantField,
+    PrimaryKeysField,
+    check_ids,
+)
+from api.fragments import bump_recipe, get_recipe_fragments
+from api.relations import get_user_relations
 
 User = get_user_model()
 
@@ -23,10 +41,13 @@ class UserSerializer(serializers.ModelSerializer):
     """
 
     is_subscribed = SerializerMethodField()
-    avatar = Base64ImageField(
+    avatar = ImageUploadField(
         required=False,
         allow_null=True,
     )
+    avatar_small = ImageVariantField(
+        "small", image_field="avatar", variants_field="avatar_variants"
+    )
 
     class Meta:
         model = User
@@ -38,6 +59,7 @@ class UserSerializer(serializers.ModelSerializer):
             "last_name",
             "is_subscribed",
             "avatar",
+            "avatar_small",
         )
         read_only_fields = ("id", "is_subscribed")
 
@@ -46,12 +68,8 @@ class UserSerializer(serializers.ModelSerializer):
         Определяет, подписан ли текущий пользователь на этого автора.
         """
 
-        request = self.context.get("request")
-        return (
-            request
-            and request.user.is_authenticated
-            and request.user.subscriptions.filter(author=obj).exists()
-        )
+        relations = get_user_relations(self.context.get("request"))
+        return obj.pk in relations.subscriptions
 
 
 class RecipeSimpleSerializer(serializers.ModelSerializer):
@@ -60,6 +78,9 @@ class RecipeSimpleSerializer(serializers.ModelSerializer):
     Используется для вложенных представлений.
     """
 
+    image_small = ImageVariantField("small")
+    image_medium = ImageVariantField("medium")
+
     class Meta:
         model = Recipe
         fields = (
@@ -67,6 +88,8 @@ class RecipeSimpleSerializer(serializers.ModelSerializer):
             "name",
             "cooking_time",
             "image",
+            "image_small",
+            "image_medium",
         )
         read_only_fields = (
             "id",
@@ -76,12 +99,26 @@ class RecipeSimpleSerializer(serializers.ModelSerializer):
         )
 
 
+class SubscribeListSerializer(serializers.ListSerializer):
+    """
+    Списочный сериализатор подписок.
+    Подгружает рецепты всех авторов страницы разом.
+    """
+
+    def to_representation(self, data):
+        authors = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        self.child.attach_recipes(authors)
+        return super().to_representation(authors)
+
+
 class SubscribeSerializer(UserSerializer):
 
     """Сериализатор для отображения подписок пользователя."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source="recipes.count")
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -89,34 +126,64 @@ class SubscribeSerializer(UserSerializer):
             "recipes",
             "recipes_count",
         )
+        list_serializer_class = SubscribeListSerializer
 
-    def get_is_subscribed(self, obj):
-        return True
+    def get_recipes_limit(self):
+        """
+        Значение recipes_limit из запроса; None - без ограничения.
+        """
 
-    def get_recipes(self, obj):
-        """Возвращает ограниченное количество рецептов пользователя."""
         request = self.context.get("request")
-        recipes = obj.recipes.all()
-
         try:
             limit = int(request.GET.get("recipes_limit", 0))
-            recipes = recipes[:limit]
         except (ValueError, TypeError):
-            pass
+            return None
+        return limit if limit >= 0 else None
+
+    def attach_recipes(self, authors):
+        """
+        Подгружает рецепты сразу для всех авторов одним оконным запросом,
+        независимо от числа авторов. Количество рецептов берётся
+        из счётчика recipes_count.
+        """
+
+        author_ids = [author.pk for author in authors]
+        limit = self.get_recipes_limit()
+        recipes = {author_id: [] for author_id in author_ids}
+        if limit != 0:
+            for recipe in Recipe.objects.top_for_authors(author_ids, limit):
+                recipes[recipe.author_id].append(recipe)
+        for author in authors:
+            author.page_recipes = recipes[author.pk]
 
+    def to_representation(self, instance):
+        if not hasattr(instance, "page_recipes"):
+            self.attach_recipes([instance])
+        return super().to_representation(instance)
+
+    def get_recipes(self, obj):
+        """Возвращает ограниченное количество рецептов пользователя."""
         return RecipeSimpleSerializer(
-            recipes,
+            obj.page_recipes,
             many=True,
             context=self.context
         ).data
 
 
 class SubscriptionCreateSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания подписки."""
+    """
+    Сериализатор для создания подписки.
+    Автор берётся из контекста, повторная подписка
+    отсекается уникальным ограничением при вставке.
+    """
+
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    author = serializers.HiddenField(default=ContextDefault("author"))
 
     class Meta:
         model = Sub
         fields = ("user", "author")
+        validators = []
 
     def validate(self, data):
         """Валидация при создании подписки."""
@@ -128,12 +195,26 @@ class SubscriptionCreateSerializer(serializers.ModelSerializer):
                 {"subscribed_to": "Нельзя подписаться на себя"}
             )
 
-        if Sub.objects.filter(user=user, author=author).exists():
+        return data
+
+    def create(self, validated_data):
+        if not links.insert_link(
+            Sub,
+            "user",
+            validated_data["user"].pk,
+            "author",
+            validated_data["author"].pk,
+        ):
+            # Ошибка из create() не проходит через run_validation,
+            # поэтому приводим её к тому же виду, что и из validate().
             raise serializers.ValidationError(
-                {"subscribed_to": "Вы уже подписаны"}
+                serializers.as_serializer_error(
+                    serializers.ValidationError(
+                        {"subscribed_to": "Вы уже подписаны"}
+                    )
+                )
             )
-
-        return data
+        return Sub(**validated_data)
 
     def to_representation(self, instance):
         """Возвращаем данные автора в AuthorWithRecipesSerializer."""
@@ -144,57 +225,110 @@ class SubscriptionCreateSerializer(serializers.ModelSerializer):
         return author_serializer.data
 
 
+class BatchItemSerializer(serializers.Serializer):
+    """
+    Подзапрос пакетного запроса: путь API с параметрами.
+    Поддерживаются только GET-запросы.
+    """
+
+    method = serializers.ChoiceField(choices=["GET"], default="GET")
+    path = serializers.CharField(max_length=2000)
+
+    def validate_path(self, value):
+        if not value.startswith("/api/"):
+            raise serializers.ValidationError(
+                "Путь должен начинаться с /api/."
+            )
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchItemSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=constants.BATCH_MAX_REQUESTS,
+    )
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """
+    Список id рецептов или авторов для пакетного добавления
+    и удаления связей. Повторы отбрасываются с сохранением порядка.
+    """
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=constants.BULK_MAX_ITEMS,
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
 class FavoriteShoppingCartSerializer(serializers.ModelSerializer):
+    """
+    Добавление рецепта из контекста в избранное или корзину
+    одним INSERT ... ON CONFLICT DO NOTHING: повторное добавление,
+    в том числе параллельное, даёт ошибку валидации.
+    """
+
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
+    recipe = serializers.HiddenField(default=ContextDefault("recipe"))
+    exists_message = ""
 
     class Meta:
         fields = ("user", "recipe")
+        validators = []
+
+    def create(self, validated_data):
+        model = self.Meta.model
+        recipe = validated_data["recipe"]
+        if not links.insert_link(
+            model, "user", validated_data["user"].pk, "recipe", recipe.pk
+        ):
+            raise serializers.ValidationError(
+                serializers.as_serializer_error(
+                    serializers.ValidationError(
+                        self.exists_message.format(name=recipe.name)
+                    )
+                )
+            )
+        return model(**validated_data)
 
 
 class FavoriteSerializer(FavoriteShoppingCartSerializer):
     """Сериализатор для избранного."""
 
+    exists_message = "Рецепт '{name}' уже в избранном."
+
     class Meta(FavoriteShoppingCartSerializer.Meta):
         model = Favorite
 
-    def validate(self, data):
-        """Есть ли уже в избранном."""
-        user = data["user"]
-        recipe = data["recipe"]
-
-        if Favorite.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                f"Рецепт '{recipe.name}' уже в избранном."
-            )
-        return data
-
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image_small = ImageVariantField("small")
+    image_medium = ImageVariantField("medium")
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = (
+            "id",
+            "name",
+            "image",
+            "image_small",
+            "image_medium",
+            "cooking_time",
+        )
 
 
 class ShoppingCartSerializer(FavoriteShoppingCartSerializer):
     """Для добавления."""
 
+    exists_message = "Рецепт '{name}' уже в корзине покупок"
+
     class Meta(FavoriteShoppingCartSerializer.Meta):
         model = ShoppingCart
-        extra_kwargs = {
-            "recipe": {"write_only": True}, "user": {"write_only": True}
-        }
-
-    def validate(self, data):
-        """Не добавлен ли."""
-        user = data["user"]
-        recipe = data["recipe"]
-
-        if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                f"Рецепт '{recipe.name}' уже в корзине покупок"
-            )
-        return data
 
     def to_representation(self, instance):
         """Краткое представление."""
@@ -253,48 +387,60 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "measurement_unit", "amount")
 
 
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """
+    Список ингредиентов рецепта. Существование всех ингредиентов
+    проверяется одним запросом после проверки отдельных элементов.
+    """
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        check_ids(
+            Ingredient.objects.all(),
+            [item["id"] for item in items],
+            "Ингредиенты с id {ids} не найдены.",
+        )
+        return items
+
+
 class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
     """
     Сериализатор для записи ингредиентов рецепта.
-    Здесь id — просто PrimaryKeyRelatedField без source,
-    чтобы на входе был просто id (pk),
-    а не объект Ingredient.
+    Здесь id — просто число без source, а не объект Ingredient:
+    существование ингредиентов проверяет список целиком.
     """
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = RecipeIngredient
         fields = ("id", "amount")
-
-    def to_internal_value(self, data):
-        """
-        Переопределяем, чтобы id вернулся как число, а не объект.
-        """
-        validated_data = super().to_internal_value(data)
-        validated_data["id"] = validated_data["id"].pk
-        return validated_data
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class AuthorSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = serializers.ImageField(allow_null=True)
+    avatar_small = ImageVariantField(
+        "small", image_field="avatar", variants_field="avatar_variants"
+    )
 
     class Meta:
         model = User
         fields = UserSerializer.Meta.fields
 
     def get_is_subscribed(self, obj):
-        user = self.context.get("request").user
-        if not user.is_authenticated:
-            return False
-        return Sub.objects.filter(user=user, author=obj).exists()
+        relations = get_user_relations(self.context.get("request"))
+        return obj.pk in relations.subscriptions
 
 
 class AuthorWithRecipesSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
+    avatar_small = ImageVariantField(
+        "small", image_field="avatar", variants_field="avatar_variants"
+    )
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -304,13 +450,8 @@ class AuthorWithRecipesSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context["request"].user
-        return (
-            user.is_authenticated and Sub.objects.filter(
-                user=user,
-                author=obj
-            ).exists()
-        )
+        relations = get_user_relations(self.context.get("request"))
+        return obj.pk in relations.subscriptions
 
     def get_recipes(self, obj):
         request = self.context.get("request")
@@ -329,19 +470,32 @@ class AuthorWithRecipesSerializer(serializers.ModelSerializer):
             context=self.context
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
 
+class RecipeListSerializer(serializers.ListSerializer):
+    """
+    Списочный сериализатор рецептов.
+    Получает закешированные фрагменты для всей страницы за один раз.
+    """
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, models.Manager) else data
+        return self.child.represent_many(list(recipes))
+
+
+class RecipeFragmentSerializer(serializers.ModelSerializer):
+    """
+    Общая для всех пользователей часть представления рецепта.
+    Строится без запроса, поэтому ссылки на изображения относительные.
+    """
 
-class RecipeReadSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     ingredients = RecipeIngredientReadSerializer(
         many=True, source="recipe_ingredients", read_only=True
     )
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_small = ImageVariantField("small")
+    image_medium = ImageVariantField("medium")
 
     class Meta:
         model = Recipe
@@ -352,34 +506,89 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             "ingredients",
             "name",
             "image",
+            "image_small",
+            "image_medium",
             "text",
             "cooking_time",
+        ]
+
+
+class RecipeReadSerializer(RecipeFragmentSerializer):
+    """
+    Представление рецепта: закешированный фрагмент
+    плюс флаги текущего пользователя.
+    """
+
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
+
+    class Meta(RecipeFragmentSerializer.Meta):
+        fields = RecipeFragmentSerializer.Meta.fields + [
             "is_favorited",
             "is_in_shopping_cart",
         ]
+        list_serializer_class = RecipeListSerializer
 
     def get_is_favorited(self, obj):
-        request = self.context.get("request")
-        return (
-            request
-            and request.user.is_authenticated
-            and obj.favorite.filter(user=request.user).exists()
-        )
+        relations = get_user_relations(self.context.get("request"))
+        return obj.pk in relations.favorites
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get("request")
-        return (
-            request
-            and request.user.is_authenticated
-            and obj.shopping_cart.filter(user=request.user).exists()
+        relations = get_user_relations(self.context.get("request"))
+        return obj.pk in relations.shopping_cart
+
+    def to_representation(self, instance):
+        return self.represent_many([instance])[0]
+
+    def represent_many(self, recipes):
+        """
+        Собирает представления рецептов из закешированных фрагментов.
+        """
+
+        fragments = get_recipe_fragments(
+            recipes,
+            lambda recipe: RecipeFragmentSerializer(recipe).data,
         )
+        return [
+            self.add_viewer_fields(fragments[recipe.pk], recipe)
+            for recipe in recipes
+        ]
+
+    def add_viewer_fields(self, fragment, recipe):
+        """
+        Дополняет фрагмент полями, зависящими от текущего пользователя.
+        """
+
+        request = self.context.get("request")
+        relations = get_user_relations(request)
+        data = dict(fragment)
+        author = dict(data["author"])
+        author["is_subscribed"] = author["id"] in relations.subscriptions
+        if request is not None:
+            for item, field in ((data, "image"), (author, "avatar")):
+                if item[field]:
+                    item[field] = request.build_absolute_uri(item[field])
+            for item, field in (
+                (data, "image_small"),
+                (data, "image_medium"),
+                (author, "avatar_small"),
+            ):
+                if item[field]:
+                    item[field] = {
+                        extension: request.build_absolute_uri(url)
+                        for extension, url in item[field].items()
+                    }
+        data["author"] = author
+        data["is_favorited"] = self.get_is_favorited(recipe)
+        data["is_in_shopping_cart"] = self.get_is_in_shopping_cart(recipe)
+        return data
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = PrimaryKeysField(
         queryset=Tag.objects.all(),
-        many=True,
+        known_ids=lambda: tag_registry.ids_by_slug.values(),
         write_only=True,
     )
 
@@ -387,7 +596,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         many=True,
         source="recipe_ingredients",
     )
-    image = Base64ImageField(required=True)
+    image = ImageUploadField(required=True)
 
     class Meta:
         model = Recipe
@@ -402,29 +611,69 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             "cooking_time",
         ]
 
+    def to_internal_value(self, data):
+        if isinstance(data, QueryDict):
+            data = self.form_to_dict(data)
+        return super().to_internal_value(data)
+
+    def form_to_dict(self, form):
+        """
+        Приводит данные multipart/form-data к виду JSON-запроса:
+        tags - повторяющиеся поля или JSON-список,
+        ingredients - JSON-список объектов {"id", "amount"}.
+        """
+
+        data = {key: form.get(key) for key in form}
+        if "tags" in form:
+            tags = form.getlist("tags")
+            if len(tags) == 1 and tags[0].lstrip().startswith("["):
+                tags = self.parse_json_field("tags", tags[0])
+            data["tags"] = tags
+        if "ingredients" in form:
+            data["ingredients"] = self.parse_json_field(
+                "ingredients", form.get("ingredients")
+            )
+        return data
+
+    @staticmethod
+    def parse_json_field(name, value):
+        try:
+            return json.loads(value)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError(
+                {name: "Ожидается JSON-список."}
+            )
+
     def validate(self, data):
         """
         Комплексная проверка данных рецепта.
         Контролирует теги, ингредиенты, время приготовления и изображение.
         """
 
-        t = data.get("tags", [])
-        ingredients = data.get("recipe_ingredients", [])
+        if self.partial and "tags" not in data:
+            t = None
+        else:
+            t = data.get("tags", [])
+        if self.partial and "recipe_ingredients" not in data:
+            ingredients = None
+        else:
+            ingredients = data.get("recipe_ingredients", [])
 
-        if not t:
+        if t is not None and not t:
             raise serializers.ValidationError(
                 {"tags": "Поле Тег не заполненно"}
             )
 
-        t_ids = [tag.id for tag in t]
+        t_ids = t or []
         if len(t_ids) != len(set(t_ids)):
             raise serializers.ValidationError({"tags": "Дублирование тегов!"})
 
-        if not ingredients:
+        if ingredients is not None and not ingredients:
             raise serializers.ValidationError(
                 {"ingredient": "Поле Ингредиент не заполненно"}
             )
 
+        ingredients = ingredients or []
         if len(ingredients) != len({i["id"] for i in ingredients}):
             raise serializers.ValidationError(
                 {"ingredients": "Ингредиенты не должны повторяться."}
@@ -456,6 +705,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
         recipe.tags.set(t_data)
         self.ing_up_and_cr(recipe, i_data)
+        bump_recipe(recipe.pk)
 
         return recipe
 
@@ -465,6 +715,8 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         Создает связи между рецептом и ингредиентами.
         """
 
+        if not ingredients_data:
+            return
         recipe_ingredients = [
             RecipeIngredient(
                 recipe=recipe,
@@ -475,31 +727,142 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ]
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
 
+    def update_ingredients(self, recipe, ingredients_data):
+        """
+        Приводит ингредиенты рецепта к переданному составу,
+        меняя только отличающиеся строки: изменённые количества -
+        одним bulk_update, лишние строки - одним DELETE,
+        новые - одним bulk_create. Изменение состава
+        переносится в списки покупок.
+        """
+
+        new_amounts = {item["id"]: item["amount"] for item in ingredients_data}
+        old_amounts = {}
+        current = {}
+        removed = []
+        for row in RecipeIngredient.objects.filter(recipe=recipe).order_by(
+            "pk"
+        ):
+            old_amounts[row.ingredient_id] = (
+                old_amounts.get(row.ingredient_id, 0) + row.amount
+            )
+            if (
+                row.ingredient_id in new_amounts
+                and row.ingredient_id not in current
+            ):
+                current[row.ingredient_id] = row
+            else:
+                removed.append(row.pk)
+
+        changed = []
+        for ingredient_id, row in current.items():
+            if row.amount != new_amounts[ingredient_id]:
+                row.amount = new_amounts[ingredient_id]
+                changed.append(row)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ["amount"])
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        self.ing_up_and_cr(
+            recipe,
+            [item for item in ingredients_data if item["id"] not in current],
+        )
+        cart_totals.propagate_recipe(recipe.pk, old_amounts, new_amounts)
+
     def update(self, instance, validated_data):
         """
         Обновляет существующий рецепт.
-        Полностью заменяет теги и ингредиенты.
+        Теги и ингредиенты меняются только если переданы,
+        и только в отличающихся строках.
         """
 
-        i_data = validated_data.pop("recipe_ingredients", [])
-        t_data = validated_data.pop("tags", [])
+        i_data = validated_data.pop("recipe_ingredients", None)
+        t_data = validated_data.pop("tags", None)
 
+        # Строка рецепта блокируется до конца транзакции: добавление
+        # рецепта в корзины ждёт, пока меняется его состав, и наоборот.
+        cart_totals.lock_recipes([instance.pk])
+        old_files = media.file_names(instance, "image", "image_variants")
         instance = super().update(instance, validated_data)
+        media.replace_files(instance, "image", "image_variants", old_files)
 
-        instance.tags.set(t_data)
-
-        instance.recipe_ingredients.all().delete()
-        self.ing_up_and_cr(instance, i_data)
+        if t_data is not None:
+            # set() без clear сам удаляет и добавляет только разницу.
+            instance.tags.set(t_data)
+        if i_data is not None:
+            self.update_ingredients(instance, i_data)
+        bump_recipe(instance.pk)
 
         return instance
 
     def to_representation(self, instance):
+        # После записи фрагмент рецепта строится заново,
+        # поэтому связанные данные подгружаются разом.
+        instance = Recipe.objects.with_related().get(pk=instance.pk)
         return RecipeReadSerializer(instance, context=self.context).data
 
 
 class AvatarSerializer(serializers.ModelSerializer):
-    avatar = Base64ImageField(required=True)
+    avatar = ImageUploadField(required=True)
 
     class Meta:
         model = User
         fields = ["avatar"]
+
+
+class ShoppingCartIngredientSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор итогового количества ингредиента в списке покупок.
+    """
+
+    id = serializers.ReadOnlyField(source="ingredient.id")
+    name = serializers.ReadOnlyField(source="ingredient.name")
+    measurement_unit = serializers.ReadOnlyField(
+        source="ingredient.measurement_unit"
+    )
+    amount = serializers.ReadOnlyField(source="total_amount")
+
+    class Meta:
+        model = ShoppingCartIngredient
+        fields = ("id", "name", "measurement_unit", "amount")
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор задачи фоновой выгрузки списка покупок.
+    """
+
+    format = serializers.ChoiceField(
+        source="export_format",
+        choices=ExportJob.Format.choices,
+        default=ExportJob.Format.DOCX,
+    )
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = (
+            "id",
+            "format",
+            "status",
+            "error",
+            "created",
+            "finished",
+            "expires_at",
+            "download_url",
+        )
+        read_only_fields = (
+            "id",
+            "status",
+            "error",
+            "created",
+            "finished",
+            "expires_at",
+        )
+
+    def get_download_url(self, obj):
+        if obj.status != ExportJob.Status.DONE:
+            return None
+        return self.context["request"].build_absolute_uri(
+            reverse("api:recipes-export-job-file", kwargs={"job_id": obj.pk})
+        )
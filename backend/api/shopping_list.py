@@ -0,0 +1,112 @@
+import csv
+from io import BytesIO
+
+from docx import Document
+
+from api import constants
+from food.models import ExportJob, ShoppingCartIngredient
+
+TITLE = "Список покупок"
+EMPTY = "Список покупок пуст!"
+HEADER = ("№", "Ингредиент", "Количество", "Единица измерения")
+
+
+def shopping_list(user):
+    """
+    Ингредиенты из списка покупок пользователя с итоговым количеством:
+    кортежи (название, единица измерения, количество).
+    Читаются из поддерживаемых инкрементально итогов корзины.
+    """
+
+    return (
+        ShoppingCartIngredient.objects.filter(user=user)
+        .order_by("ingredient__name")
+        .values_list(
+            "ingredient__name",
+            "ingredient__measurement_unit",
+            "total_amount",
+        )
+    )
+
+
+def iter_rows(user):
+    """
+    Строки списка покупок через серверный курсор:
+    в памяти одновременно не больше одной пачки строк.
+    """
+
+    return shopping_list(user).iterator(
+        chunk_size=constants.SHOPPING_LIST_CHUNK_SIZE
+    )
+
+
+def iter_txt(rows):
+    """
+    Список покупок в виде текста, по строке на ингредиент.
+    """
+
+    yield f"{TITLE}\n\n"
+    empty = True
+    for number, (name, unit, amount) in enumerate(rows, start=1):
+        empty = False
+        yield f"{number}. {name} — {amount} {unit}\n"
+    if empty:
+        yield f"{EMPTY}\n"
+
+
+class _Line:
+    """
+    Файлоподобный объект для csv.writer, возвращающий записанную строку.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    """
+    Список покупок в формате CSV с заголовком.
+    Начинается с BOM, чтобы Excel распознал UTF-8.
+    """
+
+    writer = csv.writer(_Line())
+    yield "\ufeff" + writer.writerow(HEADER)
+    for number, (name, unit, amount) in enumerate(rows, start=1):
+        yield writer.writerow((number, name, amount, unit))
+
+
+def build_docx(rows):
+    """
+    Список покупок в виде документа Word.
+    python-docx не умеет писать документ по частям,
+    поэтому он собирается целиком в памяти.
+    """
+
+    document = Document()
+    document.add_heading(TITLE, level=1)
+    table = None
+    for number, (name, unit, amount) in enumerate(rows, start=1):
+        if table is None:
+            table = document.add_table(rows=1, cols=3)
+            table.style = "Table Grid"
+            hdr_cells = table.rows[0].cells
+            hdr_cells[0].text = HEADER[0]
+            hdr_cells[1].text = HEADER[1]
+            hdr_cells[2].text = HEADER[2]
+        row_cells = table.add_row().cells
+        row_cells[0].text = str(number)
+        row_cells[1].text = name
+        row_cells[2].text = f"{amount} {unit}"
+    if table is None:
+        document.add_paragraph(EMPTY)
+
+    buffer = BytesIO()
+    document.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+TEXT_WRITERS = {
+    ExportJob.Format.TXT: iter_txt,
+    ExportJob.Format.CSV: iter_csv,
+}
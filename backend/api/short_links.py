@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import Http404
+from hashids import Hashids
+
+from api import constants, versions
+from food.models import Recipe
+
+hashids = Hashids(
+    salt=settings.SECRET_KEY, min_length=constants.SHORT_CODE_MIN_LENGTH
+)
+
+
+def encode(recipe_id):
+    return hashids.encode(recipe_id)
+
+
+def decode(short_code):
+    """
+    Возвращает id рецепта по короткому коду без обращения к базе
+    или None, если код не был выдан этим приложением.
+    """
+
+    values = hashids.decode(short_code)
+    if len(values) != 1 or encode(values[0]) != short_code:
+        return None
+    return values[0]
+
+
+class ExistenceCache:
+    """
+    LRU-множество id рецептов, существование которых уже проверено
+    в этом процессе. Удаление любого рецепта меняет общую версию
+    RECIPE_DELETIONS, и при следующей проверке множество сбрасывается
+    во всех процессах. Отсутствующие id не запоминаются.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.generation = None
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sync(self, generation):
+        if generation != self.generation:
+            self._ids.clear()
+            self.generation = generation
+
+    def exists(self, recipe_id):
+        generation = versions.get_version(versions.RECIPE_DELETIONS)
+        with self._lock:
+            self._sync(generation)
+            if recipe_id in self._ids:
+                self._ids.move_to_end(recipe_id)
+                return True
+        if not Recipe.objects.filter(pk=recipe_id).exists():
+            return False
+        with self._lock:
+            self._sync(generation)
+            self._ids[recipe_id] = None
+            if len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+        return True
+
+    def discard(self, recipe_id):
+        with self._lock:
+            self._ids.pop(recipe_id, None)
+
+
+existing_recipes = ExistenceCache(constants.SHORT_LINK_CACHE_SIZE)
+
+
+def forget(recipe_id):
+    """
+    Вызывается после удаления рецепта.
+    """
+
+    existing_recipes.discard(recipe_id)
+    versions.bump_version(versions.RECIPE_DELETIONS)
+
+
+def assign(recipe):
+    """
+    Записывает короткий код нового рецепта одним UPDATE,
+    без повторного save().
+    """
+
+    recipe.short_code = encode(recipe.pk)
+    Recipe.objects.filter(pk=recipe.pk).update(short_code=recipe.short_code)
+
+
+def get_recipe_id_or_404(recipe_id):
+    if not existing_recipes.exists(recipe_id):
+        raise Http404("Рецепт не найден.")
+    return recipe_id
+
+
+def decode_or_404(short_code):
+    recipe_id = decode(short_code)
+    if recipe_id is None:
+        raise Http404("Рецепт не найден.")
+    return get_recipe_id_or_404(recipe_id)
@@ -0,0 +1,105 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TransactionTestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from food.models import Favorite, Recipe, ShoppingCart
+from users.models import Sub
+
+User = get_user_model()
+
+THREADS = 8
+
+
+class ConcurrentLinksTest(TransactionTestCase):
+    """
+    Параллельное добавление в избранное, в корзину и подписки:
+    ровно один запрос создаёт связь, остальные получают 400
+    в прежнем формате ошибки, счётчики не расходятся.
+    """
+
+    def setUp(self):
+        self.author, self.user = (
+            User.objects.create_user(
+                email=f"user{number}@example.com",
+                username=f"user{number}",
+                first_name="Имя",
+                last_name="Фамилия",
+                password="password-12345",
+            )
+            for number in range(2)
+        )
+        image = "recipes/test.png"
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name="Блины",
+            text="Рецепт",
+            cooking_time=10,
+            image=image,
+            image_variants={"source": image},
+        )
+
+    def post_concurrently(self, path):
+        barrier = threading.Barrier(THREADS)
+        responses = []
+        lock = threading.Lock()
+
+        def post():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                response = client.post(path)
+                with lock:
+                    responses.append(response)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def assert_one_created(self, responses, error_field):
+        codes = sorted(response.status_code for response in responses)
+        self.assertEqual(
+            codes,
+            [status.HTTP_201_CREATED]
+            + [status.HTTP_400_BAD_REQUEST] * (THREADS - 1),
+        )
+        for response in responses:
+            if response.status_code == status.HTTP_400_BAD_REQUEST:
+                self.assertEqual(list(response.data), [error_field])
+                self.assertIsInstance(response.data[error_field], list)
+
+    def test_favorite(self):
+        responses = self.post_concurrently(
+            f"/api/recipes/{self.recipe.pk}/favorite/"
+        )
+        self.assert_one_created(responses, "non_field_errors")
+        self.assertEqual(Favorite.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_shopping_cart(self):
+        responses = self.post_concurrently(
+            f"/api/recipes/{self.recipe.pk}/shopping_cart/"
+        )
+        self.assert_one_created(responses, "non_field_errors")
+        self.assertEqual(ShoppingCart.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.in_cart_count, 1)
+
+    def test_subscribe(self):
+        responses = self.post_concurrently(
+            f"/api/users/{self.author.pk}/subscribe/"
+        )
+        self.assert_one_created(responses, "subscribed_to")
+        self.assertEqual(Sub.objects.count(), 1)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
@@ -28,6 +28,11 @@ router_v1.register(
     views.UserViewSet,
     basename="users"
 )
+router_v1.register(
+    "batch",
+    views.BatchViewSet,
+    basename="batch"
+)
 
 urlpatterns = [
     path("", include(router_v1.urls)),
@@ -0,0 +1,49 @@
+import time
+
+from django.core.cache import cache
+
+RECIPES = "recipes"
+TAGS = "tags"
+INGREDIENTS = "ingredients"
+USERS = "users"
+RECIPE_DELETIONS = "recipe_deletions"
+# Порядок рецептов по числу добавлений в избранное.
+POPULARITY = "popularity"
+
+
+def _cache_key(name):
+    return f"version:{name}"
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def get_versions(names):
+    """
+    Возвращает словарь {имя: версия}.
+    Отсутствующие в кеше версии создаются.
+    """
+
+    keys = {name: _cache_key(name) for name in names}
+    cached = cache.get_many(keys.values())
+    missing = [key for key in keys.values() if key not in cached]
+    if missing:
+        version = _new_version()
+        for key in missing:
+            cache.add(key, version, None)
+        cached.update(cache.get_many(missing))
+    return {name: cached.get(key) for name, key in keys.items()}
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def bump_version(*names):
+    """
+    Меняет версии, делая недействительными все ключи, построенные на них.
+    """
+
+    version = _new_version()
+    cache.set_many({_cache_key(name): version for name in names}, None)
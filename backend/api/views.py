@@ -1,22 +1,25 @@
-from io import BytesIO
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import F
 from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import FileResponse, HttpResponseRedirect
+from django.http import (
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404
 from rest_framework import response
-from docx import Document
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from django.db.models.functions import Lower
 from django.contrib.auth import get_user_model
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework.response import Response
 from rest_framework import permissions
 from django.shortcuts import redirect
-from hashids import Hashids
-from django.conf import settings
 
 from . import serializers as myserializers
 from food.models import (
@@ -25,27 +28,43 @@ from food.models import (
     Ingredient,
     Favorite,
     ShoppingCart,
-    RecipeIngredient,
+    ShoppingCartIngredient,
+    ExportJob,
 )
 from users.models import Sub
 from api import (
+    batch as tools_batch,
+    constants as app_constants,
+    cart_totals as tools_cart_totals,
+    catalog as tools_catalog,
+    counters as tools_counters,
+    exports as tools_exports,
+    export_jobs as tools_export_jobs,
+    conditional as tools_conditional,
     paginators as tools_paginators,
     filters as tools_filters,
+    links as tools_links,
+    media as tools_media,
     permissions as tools_permissions,
+    relations as tools_relations,
+    renderers as tools_renderers,
+    short_links as tools_short_links,
+    shopping_list as tools_shopping_list,
+    versions as tools_versions,
 )
 
 
-hashids = Hashids(salt=settings.SECRET_KEY, min_length=5)
-
 User = get_user_model()
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(tools_conditional.ConditionalGetMixin, DjoserUserViewSet):
     """
     Кастомное представление для пользователей.
     """
 
     pagination_class = tools_paginators.Paginator
+    condition_versions = (tools_versions.USERS,)
+    personalized = True
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -75,12 +94,20 @@ class UserViewSet(DjoserUserViewSet):
         methods=["put"],
         permission_classes=[IsAuthenticated],
         url_path="me/avatar",
+        parser_classes=[JSONParser, MultiPartParser, FormParser],
     )
     def avatar(self, request, *args, **kwargs):
         serializer = myserializers.AvatarSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        request.user.avatar = serializer.validated_data["avatar"]
-        request.user.save()
+        old_files = tools_media.file_names(
+            request.user, "avatar", "avatar_variants"
+        )
+        with transaction.atomic():
+            request.user.avatar = serializer.validated_data["avatar"]
+            request.user.save()
+            tools_media.replace_files(
+                request.user, "avatar", "avatar_variants", old_files
+            )
 
         response_serializer = myserializers.AvatarSerializer(
             request.user, context={"request": request}
@@ -90,9 +117,11 @@ class UserViewSet(DjoserUserViewSet):
     @avatar.mapping.delete
     def avatar_delete(self, request, *args, **kwargs):
         if request.user.avatar:
-            request.user.avatar.delete()
-            request.user.avatar = None
-            request.user.save()
+            # Файлы освобождает сигнал сохранения пользователя.
+            with transaction.atomic():
+                request.user.avatar = None
+                request.user.avatar_variants = {}
+                request.user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -103,14 +132,20 @@ class UserViewSet(DjoserUserViewSet):
     )
     def subscribe(self, request, *args, **kwargs):
         author = self.get_object()
-        user = request.user
 
         serializer = myserializers.SubscriptionCreateSerializer(
-            data={"user": user.id, "author": author.id},
-            context={"request": request},
+            data={},
+            context={"request": request, "author": author},
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            tools_counters.change_counter(
+                User, author.id, tools_counters.SUBSCRIBERS_COUNT, 1
+            )
+        tools_relations.refresh_relation(
+            request, tools_relations.SUBSCRIPTIONS
+        )
 
         return response.Response(
             serializer.data,
@@ -122,10 +157,15 @@ class UserViewSet(DjoserUserViewSet):
         author = self.get_object()
         user = request.user
 
-        deleted_count, _ = Sub.objects.filter(
-            user=user,
-            author=author
-        ).delete()
+        with transaction.atomic():
+            deleted_count, _ = Sub.objects.filter(
+                user=user,
+                author=author
+            ).delete()
+            if deleted_count:
+                tools_counters.change_counter(
+                    User, author.id, tools_counters.SUBSCRIBERS_COUNT, -1
+                )
 
         if not deleted_count:
             return response.Response(
@@ -133,6 +173,9 @@ class UserViewSet(DjoserUserViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        tools_relations.refresh_relation(
+            request, tools_relations.SUBSCRIPTIONS
+        )
         return response.Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -140,42 +183,132 @@ class UserViewSet(DjoserUserViewSet):
         methods=["get"],
         permission_classes=[permissions.IsAuthenticated],
         url_path="subscriptions",
+        pagination_class=tools_paginators.SubscriptionPaginator,
     )
     def subscriptions(self, request, *args, **kwargs):
         user = request.user
-        queryset = User.objects.filter(users_subscribers__user=user)
+        queryset = User.objects.filter(
+            users_subscribers__user=user
+        ).annotate(subscription_id=F("users_subscribers__id"))
         pages = self.paginate_queryset(queryset)
         serializer = myserializers.SubscribeSerializer(
             pages, many=True, context={"request": request}
         )
         return self.get_paginated_response(serializer.data)
 
+    @action(
+        detail=False,
+        methods=["post"],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path="subscribe/bulk",
+        url_name="subscribe-bulk",
+    )
+    def subscribe_bulk(self, request, *args, **kwargs):
+        return bulk_add_links(
+            request,
+            Sub,
+            "author",
+            User,
+            tools_counters.SUBSCRIBERS_COUNT,
+            tools_relations.SUBSCRIPTIONS,
+            invalid={request.user.id},
+        )
+
+    @subscribe_bulk.mapping.delete
+    def unsubscribe_bulk(self, request, *args, **kwargs):
+        return bulk_remove_links(
+            request,
+            Sub,
+            "author",
+            User,
+            tools_counters.SUBSCRIBERS_COUNT,
+            tools_relations.SUBSCRIPTIONS,
+        )
+
+
+class BatchViewSet(viewsets.ViewSet):
+    """
+    Пакетный запрос: несколько GET-запросов к API одним
+    HTTP-запросом. Подзапросы выполняются внутри процесса
+    с уже аутентифицированным пользователем и общими
+    связями пользователя, ответы возвращаются одним телом.
+    """
+
+    permission_classes = [permissions.AllowAny]
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def create(self, request):
+        serializer = myserializers.BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tools_relations.get_user_relations(request)
+        content = tools_batch.run(
+            request,
+            [item["path"] for item in serializer.validated_data["requests"]],
+        )
+        return HttpResponse(content, content_type="application/json")
+
+
+class RecipeViewSet(
+    tools_conditional.ConditionalGetMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Recipe.objects.all()
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly,
         tools_permissions.IsAuthorOrReadOnlyPermission,
     ]
-    pagination_class = tools_paginators.Paginator
+    pagination_class = tools_paginators.RecipePaginator
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
     filter_backends = [DjangoFilterBackend]
     filterset_class = tools_filters.RecipeFilter
+    condition_versions = (
+        tools_versions.RECIPES,
+        tools_versions.TAGS,
+        tools_versions.INGREDIENTS,
+        tools_versions.USERS,
+    )
+    personalized = True
+
+    def get_condition_versions(self, request):
+        names = super().get_condition_versions(request)
+        if "popular" in request.query_params:
+            # Порядок по популярности зависит от счётчиков избранного.
+            names.append(tools_versions.POPULARITY)
+        return names
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ["list", "retrieve"]:
+            queryset = queryset.with_related()
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ["list", "retrieve"]:
             return myserializers.RecipeReadSerializer
         return myserializers.RecipeWriteSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
         recipe = serializer.save()
+        tools_counters.change_counter(
+            User, recipe.author_id, tools_counters.RECIPES_COUNT, 1
+        )
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
 
-        recipe.short_code = hashids.encode(recipe.id)
-        recipe.save()
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        author_id = instance.author_id
+        instance.delete()
+        tools_counters.change_counter(
+            User, author_id, tools_counters.RECIPES_COUNT, -1
+        )
 
     @action(detail=False, methods=["get"], url_path="r/(?P<short_code>[^/.]+)")
     def redirect_by_short_code(self, request, short_code=None):
-        recipe = get_object_or_404(Recipe, short_code=short_code)
-        return redirect(f"/recipes/{recipe.id}/")
+        recipe_id = tools_short_links.decode_or_404(short_code)
+        return redirect(f"/recipes/{recipe_id}/")
 
     @action(
         detail=True,
@@ -185,7 +318,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def link(self, request, *args, **kwargs):
         recipe = self.get_object()
         base_url = request.build_absolute_uri('/')[:-1]
-        short_url = f'{base_url}/api/recipes/r/{recipe.short_code}'
+        short_code = tools_short_links.encode(recipe.pk)
+        short_url = f'{base_url}/api/recipes/r/{short_code}'
         return response.Response(
             {'short-link': short_url}, status=status.HTTP_200_OK
         )
@@ -200,11 +334,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = get_object_or_404(Recipe, id=pk)
 
         serializer = myserializers.ShoppingCartSerializer(
-            data={"user": request.user.id, "recipe": recipe.id},
-            context={"request": request},
+            data={},
+            context={"request": request, "recipe": recipe},
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            tools_cart_totals.lock_recipes([recipe.id])
+            serializer.save()
+            tools_counters.change_counter(
+                Recipe, recipe.id, tools_counters.IN_CART_COUNT, 1
+            )
+            tools_cart_totals.add_recipe(request.user.id, recipe.id)
+        tools_relations.refresh_relation(
+            request, tools_relations.SHOPPING_CART
+        )
 
         return response.Response(
             serializer.data,
@@ -214,9 +357,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @shopping_cart.mapping.delete
     def remove_from_shopping_cart(self, request, pk=None):
         recipe = get_object_or_404(Recipe, pk=pk)
-        deleted_count, _ = ShoppingCart.objects.filter(
-            user=request.user, recipe=recipe
-        ).delete()
+        with transaction.atomic():
+            tools_cart_totals.lock_recipes([recipe.id])
+            deleted_count, _ = ShoppingCart.objects.filter(
+                user=request.user, recipe=recipe
+            ).delete()
+            if deleted_count:
+                tools_counters.change_counter(
+                    Recipe, recipe.id, tools_counters.IN_CART_COUNT, -1
+                )
+                tools_cart_totals.remove_recipe(request.user.id, recipe.id)
 
         if not deleted_count:
             return response.Response(
@@ -224,6 +374,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        tools_relations.refresh_relation(
+            request, tools_relations.SHOPPING_CART
+        )
         return response.Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -236,11 +389,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = get_object_or_404(Recipe, id=pk)
 
         serializer = myserializers.FavoriteSerializer(
-            data={"user": request.user.id, "recipe": recipe.id},
-            context={"request": request},
+            data={},
+            context={"request": request, "recipe": recipe},
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            tools_counters.change_counter(
+                Recipe, recipe.id, tools_counters.FAVORITES_COUNT, 1
+            )
+        tools_relations.refresh_relation(request, tools_relations.FAVORITES)
 
         recipe_serializer = myserializers.RecipeShortSerializer(
             recipe,
@@ -254,9 +412,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @favorite.mapping.delete
     def remove_from_favorite(self, request, pk=None):
         recipe = get_object_or_404(Recipe, pk=pk)
-        deleted_count, _ = Favorite.objects.filter(
-            user=request.user, recipe=recipe
-        ).delete()
+        with transaction.atomic():
+            deleted_count, _ = Favorite.objects.filter(
+                user=request.user, recipe=recipe
+            ).delete()
+            if deleted_count:
+                tools_counters.change_counter(
+                    Recipe, recipe.id, tools_counters.FAVORITES_COUNT, -1
+                )
 
         if not deleted_count:
             return response.Response(
@@ -264,64 +427,220 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        tools_relations.refresh_relation(request, tools_relations.FAVORITES)
         return response.Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="favorite/bulk",
+        url_name="favorite-bulk",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def favorite_bulk(self, request):
+        return bulk_add_links(
+            request,
+            Favorite,
+            "recipe",
+            Recipe,
+            tools_counters.FAVORITES_COUNT,
+            tools_relations.FAVORITES,
+        )
+
+    @favorite_bulk.mapping.delete
+    def remove_from_favorite_bulk(self, request):
+        return bulk_remove_links(
+            request,
+            Favorite,
+            "recipe",
+            Recipe,
+            tools_counters.FAVORITES_COUNT,
+            tools_relations.FAVORITES,
+        )
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="shopping_cart/bulk",
+        url_name="shopping_cart-bulk",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def shopping_cart_bulk(self, request):
+        return bulk_add_links(
+            request,
+            ShoppingCart,
+            "recipe",
+            Recipe,
+            tools_counters.IN_CART_COUNT,
+            tools_relations.SHOPPING_CART,
+            on_change=tools_cart_totals.add_recipes,
+        )
+
+    @shopping_cart_bulk.mapping.delete
+    def remove_from_shopping_cart_bulk(self, request):
+        return bulk_remove_links(
+            request,
+            ShoppingCart,
+            "recipe",
+            Recipe,
+            tools_counters.IN_CART_COUNT,
+            tools_relations.SHOPPING_CART,
+            on_change=tools_cart_totals.remove_recipes,
+        )
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="shopping_cart_totals",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def shopping_cart_totals(self, request):
+        """
+        Итоговое количество ингредиентов в списке покупок.
+        """
+
+        totals = ShoppingCartIngredient.objects.filter(
+            user=request.user
+        ).select_related("ingredient").order_by("ingredient__name")
+        serializer = myserializers.ShoppingCartIngredientSerializer(
+            totals, many=True
+        )
+        return response.Response(serializer.data)
+
     @action(
         detail=False,
         methods=["get"],
         url_path="download_shopping_cart",
         permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=[
+            JSONRenderer,
+            tools_renderers.DocxRenderer,
+            tools_renderers.PlainTextRenderer,
+            tools_renderers.CSVRenderer,
+        ],
     )
     def download_shopping_cart(self, request):
-        document = Document()
-        document.add_heading("Список покупок", level=1)
+        """
+        Выгрузка списка покупок в формате ?format=docx|txt|csv
+        (по умолчанию docx). Текстовые форматы отдаются потоком.
+        Готовые файлы кешируются на диске по ключу из содержимого
+        корзины и отдаются повторно с поддержкой ETag и Range.
+        """
+
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, tools_renderers.ExportRenderer):
+            renderer = tools_renderers.DocxRenderer()
+        filename = (
+            f"{app_constants.SHOPPING_LIST_FILENAME}.{renderer.format}"
+        )
 
-        recipes_shop = request.user.shopping_cart.all()
-        ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__in=recipes_shop.values_list("recipe", flat=True)
+        def build(path):
+            writer = tools_shopping_list.TEXT_WRITERS.get(renderer.format)
+            if writer is None:
+                tools_exports.write_export(
+                    request.user, renderer.format, path
+                )
+                return None
+            rows = tools_shopping_list.iter_rows(request.user)
+            return StreamingHttpResponse(
+                tools_exports.tee_export(path, writer(rows))
             )
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(total_amount=Sum("amount"))
-            .order_by("ingredient__name")
-        )
-
-        if ingredients:
-            table = document.add_table(rows=1, cols=3)
-            table.style = "Table Grid"
-            hdr_cells = table.rows[0].cells
-            hdr_cells[0].text = "№"
-            hdr_cells[1].text = "Ингредиент"
-            hdr_cells[2].text = "Количество"
-
-            for idx, ing in enumerate(ingredients, start=1):
-                row_cells = table.add_row().cells
-                row_cells[0].text = str(idx)
-                row_cells[1].text = ing["ingredient__name"]
-                row_cells[2].text = (
-                    f"{ing['total_amount']} "
-                    f"{ing['ingredient__measurement_unit']}"
+
+        return tools_exports.cached_export(
+            request, renderer.format, renderer.content_type, filename, build
+        )
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="download_shopping_cart/jobs",
+        url_name="export-jobs",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def create_export_job(self, request):
+        """
+        Ставит выгрузку списка покупок в очередь фонового воркера.
+        """
+
+        serializer = myserializers.ExportJobSerializer(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        job = tools_export_jobs.enqueue(
+            request, serializer.validated_data["export_format"]
+        )
+        return response.Response(
+            myserializers.ExportJobSerializer(
+                job, context={"request": request}
+            ).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={
+                "Location": reverse(
+                    "api:recipes-export-job", kwargs={"job_id": job.pk}
                 )
-        else:
-            document.add_paragraph("Список покупок пуст!")
+            },
+        )
 
-        buffer = BytesIO()
-        document.save(buffer)
-        buffer.seek(0)
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path=r"download_shopping_cart/jobs/(?P<job_id>[0-9a-f-]{36})",
+        url_name="export-job",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def export_job(self, request, job_id=None):
+        """
+        Состояние задачи выгрузки.
+        """
 
-        content_type = (
-            "application/vnd.openxmlformats-officedocument."
-            "wordprocessingml.document"
+        job = get_object_or_404(ExportJob, pk=job_id, user=request.user)
+        return response.Response(
+            myserializers.ExportJobSerializer(
+                job, context={"request": request}
+            ).data
         )
-        return FileResponse(
-            buffer,
-            as_attachment=True,
-            filename="shopping_list.docx",
-            content_type=content_type,
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path=(
+            r"download_shopping_cart/jobs/(?P<job_id>[0-9a-f-]{36})/file"
+        ),
+        url_name="export-job-file",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def export_job_file(self, request, job_id=None):
+        """
+        Готовый файл выгрузки.
+        """
+
+        job = get_object_or_404(ExportJob, pk=job_id, user=request.user)
+        if job.status != ExportJob.Status.DONE:
+            return response.Response(
+                {"errors": "Выгрузка ещё не готова"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        renderer = tools_renderers.EXPORT_RENDERERS[job.export_format]()
+        export = tools_exports.cached_export(
+            request,
+            job.export_format,
+            renderer.content_type,
+            f"{app_constants.SHOPPING_LIST_FILENAME}.{renderer.format}",
+            build=None,
+            key=job.key,
         )
+        if export is None:
+            return response.Response(
+                {"errors": "Файл выгрузки больше не доступен"},
+                status=status.HTTP_410_GONE,
+            )
+        return export
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(
+    tools_conditional.ConditionalGetMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     """
     Получение списка тэгов.
     Создание и редактирование только в админке.
@@ -330,9 +649,27 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = myserializers.TagSerializer
     pagination_class = None
+    condition_versions = (tools_versions.TAGS,)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(self.list_from_registry, request)
 
+    def list_from_registry(self, request):
+        """
+        Заранее отрендеренный список тегов, без запроса к базе
+        и сериализации.
+        """
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+        return HttpResponse(
+            tools_catalog.tag_registry.content,
+            content_type="application/json",
+        )
+
+
+class IngredientViewSet(
+    tools_conditional.ConditionalGetMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     """
     Получение списка ингредиентов.
     Создание и редактирование только в админке.
@@ -343,11 +680,122 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = tools_filters.IngredientSearchFilter
     pagination_class = None
+    condition_versions = (tools_versions.INGREDIENTS,)
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("search"):
+            return self.conditional(self.list_from_database, request)
+        return self.conditional(self.list_from_snapshot, request)
+
+    def list_from_database(self, request):
+        """
+        Поиск по подстроке и с учётом опечаток через триграммный индекс.
+        """
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(
+            queryset[:app_constants.INGREDIENT_SEARCH_LIMIT], many=True
+        )
+        return Response(serializer.data)
+
+    def list_from_snapshot(self, request):
+        """
+        Поиск по началу названия по снимку каталога, без запроса к базе.
+        """
+
+        catalog = tools_catalog.catalog
+        name = request.query_params.get("name")
+        if name:
+            return Response(catalog.search_ingredients(name))
+        return Response(catalog.ingredients())
 
 
 def redirect_to_recipe(request, short_code):
-    recipe = get_object_or_404(Recipe, short_code=short_code)
+    recipe_id = tools_short_links.decode_or_404(short_code)
     url = request.build_absolute_uri(
-        reverse("recipes-detail", kwargs={"pk": recipe.pk})
+        reverse("api:recipes-detail", kwargs={"pk": recipe_id})
     )
     return HttpResponseRedirect(url)
+
+
+def bulk_add_links(
+    request,
+    model,
+    target_field,
+    target_model,
+    counter,
+    relation,
+    on_change=None,
+    invalid=(),
+):
+    """
+    Пакетное добавление связей текущего пользователя
+    (избранное, корзина, подписки) за постоянное число запросов:
+    проверка существования, одна вставка, одно обновление счётчиков.
+    on_change(user_id, добавленные id) вызывается в той же транзакции.
+    Возвращает результат для каждого id: added, exists, not_found
+    или invalid для id из invalid.
+    """
+
+    serializer = myserializers.BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = serializer.validated_data["ids"]
+    user_id = request.user.id
+
+    with transaction.atomic():
+        # Строки целей блокируются до вставки связей, чтобы итоги
+        # корзины не разошлись с параллельным изменением рецепта.
+        found = tools_links.lock_targets(target_model, ids) - set(invalid)
+        added = tools_links.insert_links(
+            model, "user", user_id, target_field, found
+        )
+        tools_counters.change_counters(target_model, added, counter, 1)
+        if on_change is not None:
+            on_change(user_id, added)
+    if added:
+        tools_relations.refresh_relation(request, relation)
+
+    statuses = dict.fromkeys(invalid, tools_links.INVALID)
+    statuses.update(dict.fromkeys(found, tools_links.EXISTS))
+    statuses.update(dict.fromkeys(added, tools_links.ADDED))
+    return Response(
+        {"results": tools_links.results(ids, statuses, tools_links.NOT_FOUND)}
+    )
+
+
+def bulk_remove_links(
+    request,
+    model,
+    target_field,
+    target_model,
+    counter,
+    relation,
+    on_change=None,
+):
+    """
+    Пакетное удаление связей текущего пользователя одним
+    DELETE ... RETURNING и одним обновлением счётчиков.
+    on_change(user_id, удалённые id) вызывается в той же транзакции.
+    Возвращает результат для каждого id: removed или not_found.
+    """
+
+    serializer = myserializers.BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = serializer.validated_data["ids"]
+    user_id = request.user.id
+
+    with transaction.atomic():
+        tools_links.lock_targets(target_model, ids)
+        removed = tools_links.delete_links(
+            model, "user", user_id, target_field, ids
+        )
+        tools_counters.change_counters(target_model, removed, counter, -1)
+        if on_change is not None:
+            on_change(user_id, removed)
+    if removed:
+        tools_relations.refresh_relation(request, relation)
+
+    statuses = dict.fromkeys(removed, tools_links.REMOVED)
+    return Response(
+        {"results": tools_links.results(ids, statuses, tools_links.NOT_FOUND)}
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from api import cart_totals, fragments
 from . import models
 
 
@@ -34,6 +35,8 @@ class RecipeAdmin(admin.ModelAdmin):
         "id",
         "name",
         "author",
+        "in_favorites",
+        "in_cart_count",
     )
     list_filter = (
         "name",
@@ -42,9 +45,19 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     inlines = [RecipeIngredientInline]
 
+    def save_related(self, request, form, formsets, change):
+        old_amounts = cart_totals.recipe_amounts(form.instance.pk)
+        super().save_related(request, form, formsets, change)
+        cart_totals.propagate_recipe(
+            form.instance.pk,
+            old_amounts,
+            cart_totals.recipe_amounts(form.instance.pk),
+        )
+        fragments.bump_recipe(form.instance.pk)
+
     @admin.display(description="Количество в избранных")
     def in_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 @admin.register(models.ShoppingCart)
@@ -63,3 +76,16 @@ class FavoriteAdmin(admin.ModelAdmin):
         "recipe",
         "user",
     )
+
+
+@admin.register(models.ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "user",
+        "export_format",
+        "status",
+        "created",
+        "expires_at",
+    )
+    list_filter = ("status", "export_format")
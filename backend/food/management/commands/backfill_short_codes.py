@@ -0,0 +1,44 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from api import constants
+from api.short_links import encode
+from food.models import Recipe
+
+
+class Command(BaseCommand):
+
+    help = 'Заполнение коротких кодов рецептов, у которых их нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=constants.SHORT_CODE_BATCH_SIZE,
+            help='Сколько рецептов обновлять одним запросом',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        missing = Recipe.objects.filter(
+            Q(short_code__isnull=True) | Q(short_code='')
+        ).order_by('pk')
+        last_pk = 0
+        updated = 0
+        while True:
+            pks = list(
+                missing.filter(pk__gt=last_pk).values_list(
+                    'pk', flat=True
+                )[:batch_size]
+            )
+            if not pks:
+                break
+            with transaction.atomic():
+                updated += Recipe.objects.bulk_update(
+                    [Recipe(pk=pk, short_code=encode(pk)) for pk in pks],
+                    ['short_code'],
+                )
+            last_pk = pks[-1]
+        self.stdout.write(
+            self.style.SUCCESS(f'Заполнено коротких кодов: {updated}')
+        )
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from api.catalog import write_snapshot
+
+
+class Command(BaseCommand):
+
+    help = 'Запись снимка каталога ингредиентов и тегов для воркеров'
+
+    def handle(self, *args, **options):
+        size = write_snapshot()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Снимок каталога ({size} байт) записан в '
+                f'{settings.CATALOG_SNAPSHOT_PATH}'
+            )
+        )
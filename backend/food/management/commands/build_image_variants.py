@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db.models import F, Q
+from django.db.models.fields.json import KeyTextTransform
+
+from api import fragments, images, media
+from food.models import Recipe
+
+User = get_user_model()
+
+SOURCES = (
+    (Recipe, 'image', 'image_variants', fragments.bump_recipe),
+    (User, 'avatar', 'avatar_variants', fragments.bump_user),
+)
+
+
+class Command(BaseCommand):
+
+    help = 'Построение уменьшенных копий картинок рецептов и аватаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.IMAGE_WORKERS,
+            help='Число потоков, обрабатывающих изображения',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перестроить копии, даже если они уже есть',
+        )
+
+    def handle(self, *args, workers, force, **options):
+        shared = images.build_shared_variants(
+            User, 'avatar', 'avatar_variants', fragments.bump_user
+        )
+        self.stdout.write(f'Аватар по умолчанию: обновлено строк {shared}')
+        for model, image_field, variants_field, on_done in SOURCES:
+            rows = model.objects.exclude(**{image_field: ''}).exclude(
+                **{f'{image_field}__isnull': True}
+            )
+            if not force:
+                rows = rows.annotate(
+                    source=KeyTextTransform('source', variants_field)
+                ).filter(Q(source__isnull=True) | ~Q(source=F(image_field)))
+            names = (
+                set(rows.values_list(image_field, flat=True))
+                - media.PROTECTED
+            )
+            with ThreadPoolExecutor(workers) as executor:
+                updated = sum(
+                    executor.map(
+                        lambda name: images.process(
+                            model,
+                            name,
+                            image_field,
+                            variants_field,
+                            on_done,
+                            force=force,
+                        ),
+                        names,
+                    )
+                )
+            self.stdout.write(
+                f'{model._meta.model_name}: файлов {len(names)}, '
+                f'обновлено строк {updated}'
+            )
+        self.stdout.write(self.style.SUCCESS('Копии изображений построены'))
@@ -1,5 +1,6 @@
 from csv import reader as csv_reader
 from django.core.management import BaseCommand
+from api import catalog, versions
 from food.models import Ingredient
 
 
@@ -32,10 +33,13 @@ class Command(BaseCommand):
         ]
 
     def _save_to_database(self, items):
-        return len(Ingredient.objects.bulk_create(
+        saved_count = len(Ingredient.objects.bulk_create(
             items,
             ignore_conflicts=True
         ))
+        catalog.write_snapshot()
+        versions.bump_version(versions.INGREDIENTS)
+        return saved_count
 
     def _show_success_message(self, count, path):
         self.stdout.write(
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from api.exports import prune_exports
+
+
+class Command(BaseCommand):
+
+    help = 'Удаление выгрузок списков покупок, к которым давно не обращались'
+
+    def handle(self, *args, **options):
+        removed = prune_exports(settings.SHOPPING_LIST_EXPORT_TTL)
+        self.stdout.write(
+            self.style.SUCCESS(f'Удалено выгрузок: {removed}')
+        )
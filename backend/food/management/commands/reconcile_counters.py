@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api import cart_totals, counters, versions
+from food.models import Favorite, Recipe, ShoppingCart
+from users.models import Sub
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, counters.FAVORITES_COUNT, Favorite, 'recipe'),
+    (Recipe, counters.IN_CART_COUNT, ShoppingCart, 'recipe'),
+    (User, counters.RECIPES_COUNT, Recipe, 'author'),
+    (User, counters.SUBSCRIBERS_COUNT, Sub, 'author'),
+)
+
+
+def actual_count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('id'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Сверка денормализованных счётчиков и итогов списков покупок '
+        'с фактическими данными'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, не исправляя их',
+        )
+
+    def handle(self, *args, dry_run=False, **options):
+        for model, counter, related, field in COUNTERS:
+            with transaction.atomic():
+                drifted = model.objects.exclude(
+                    **{counter: actual_count(related, field)}
+                )
+                if dry_run:
+                    fixed = drifted.count()
+                else:
+                    fixed = drifted.update(
+                        **{counter: actual_count(related, field)}
+                    )
+                    if fixed and counter == counters.FAVORITES_COUNT:
+                        versions.bump_version(versions.POPULARITY)
+            self.stdout.write(
+                f'{model._meta.model_name}.{counter}: '
+                f'расхождений {fixed}'
+            )
+        if not dry_run:
+            rows = cart_totals.rebuild()
+            self.stdout.write(f'Итоги списков покупок пересчитаны: {rows}')
+        self.stdout.write(self.style.SUCCESS('Сверка счётчиков завершена'))
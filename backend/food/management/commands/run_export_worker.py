@@ -0,0 +1,73 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connections
+
+from api import export_jobs
+
+CLEANUP_INTERVAL = 60
+
+
+class Command(BaseCommand):
+
+    help = 'Фоновая выгрузка списков покупок из очереди в базе данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=settings.EXPORT_WORKER_PROCESSES,
+            help='Число процессов, строящих файлы',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.EXPORT_WORKER_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, секунд',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь и завершиться',
+        )
+
+    def handle(self, *args, processes, poll_interval, once, **options):
+        context = multiprocessing.get_context('fork')
+        running = set()
+        cleaned = 0
+        with ProcessPoolExecutor(processes, mp_context=context) as executor:
+            while True:
+                if time.monotonic() - cleaned > CLEANUP_INTERVAL:
+                    expired, removed = export_jobs.cleanup()
+                    cleaned = time.monotonic()
+                    if expired or removed:
+                        self.stdout.write(
+                            f'Удалено задач: {expired}, файлов: {removed}'
+                        )
+                ids = export_jobs.claim(processes - len(running))
+                if ids:
+                    # Дочерние процессы создаются форком и не должны
+                    # унаследовать открытое соединение с базой.
+                    connections.close_all()
+                    running.update(
+                        executor.submit(export_jobs.run, job_id)
+                        for job_id in ids
+                    )
+                if not running:
+                    if once:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                done, running = wait(
+                    running,
+                    timeout=poll_interval,
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    if future.exception() is not None:
+                        self.stderr.write(
+                            f'Ошибка воркера: {future.exception()}'
+                        )
@@ -0,0 +1,63 @@
+# Generated by Django 4.2 on 2026-10-17 04:41
+
+from django.db import migrations, models
+
+# Дубли остаются от проверки .exists() перед вставкой:
+# сохраняется самая ранняя строка каждой пары.
+DEDUPE = """
+    DELETE FROM {table} AS row
+    USING {table} AS kept
+    WHERE kept.user_id = row.user_id
+      AND kept.recipe_id = row.recipe_id
+      AND kept.id < row.id
+"""
+
+# Счётчики и итоги списков покупок учитывали дубли.
+RECOUNT = """
+    UPDATE food_recipe SET
+        favorites_count = (
+            SELECT COUNT(*) FROM food_favorite
+            WHERE food_favorite.recipe_id = food_recipe.id
+        ),
+        in_cart_count = (
+            SELECT COUNT(*) FROM food_shoppingcart
+            WHERE food_shoppingcart.recipe_id = food_recipe.id
+        )
+"""
+
+REFILL_TOTALS = """
+    DELETE FROM food_shoppingcartingredient;
+    INSERT INTO food_shoppingcartingredient (user_id, ingredient_id, total_amount)
+    SELECT cart.user_id, item.ingredient_id, SUM(item.amount)
+    FROM food_shoppingcart AS cart
+    JOIN food_recipeingredient AS item ON item.recipe_id = cart.recipe_id
+    GROUP BY cart.user_id, item.ingredient_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("food", "0009_image_variants"),
+    ]
+
+    operations = [
+        migrations.RunSQL(DEDUPE.format(table="food_favorite"), migrations.RunSQL.noop),
+        migrations.RunSQL(
+            DEDUPE.format(table="food_shoppingcart"), migrations.RunSQL.noop
+        ),
+        migrations.RunSQL(RECOUNT, migrations.RunSQL.noop),
+        migrations.RunSQL(REFILL_TOTALS, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name="favorite",
+            constraint=models.UniqueConstraint(
+                fields=("user", "recipe"), name="unique_favorite"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="shoppingcart",
+            constraint=models.UniqueConstraint(
+                fields=("user", "recipe"), name="unique_shopping_cart"
+            ),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2 on 2026-10-17 05:02
+
+from collections import Counter
+
+from django.db import migrations, models
+
+VARIANT_SIZES = ("small", "medium")
+
+
+def row_names(image, variants):
+    names = [image]
+    for size in VARIANT_SIZES:
+        names += ((variants or {}).get(size) or {}).values()
+    return [name for name in names if name]
+
+
+def count_references(apps, schema_editor):
+    Recipe = apps.get_model("food", "Recipe")
+    User = apps.get_model("users", "ExtendedUser")
+    MediaFile = apps.get_model("food", "MediaFile")
+    default_avatar = User._meta.get_field("avatar").default
+    counts = Counter()
+    for model, image_field, variants_field in (
+        (Recipe, "image", "image_variants"),
+        (User, "avatar", "avatar_variants"),
+    ):
+        rows = model.objects.values_list(image_field, variants_field)
+        for image, variants in rows.iterator():
+            counts.update(row_names(image, variants))
+    counts.pop(default_avatar, None)
+    MediaFile.objects.bulk_create(
+        MediaFile(name=name, references_count=count) for name, count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("food", "0010_unique_favorite_shopping_cart"),
+        ("users", "0004_image_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaFile",
+            fields=[
+                (
+                    "name",
+                    models.CharField(
+                        max_length=255,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Файл",
+                    ),
+                ),
+                (
+                    "references_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Число ссылок"),
+                ),
+            ],
+            options={
+                "verbose_name": "Медиафайл",
+                "verbose_name_plural": "Медиафайлы",
+            },
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,15 @@
+import uuid
+
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber, Upper
 
 from api import constants as cnst
+from api.counters import CountersModelMixin
 
 User = get_user_model()
 
@@ -44,7 +51,8 @@ class Ingredient(models.Model):
     measurement_unit - единица измерения (str).
     На уровне базы данных по умолчанию сортировка по названию.
     Также определена уникальная комбинация названия ингредиента
-    и единицы его измерения.
+    и единицы его измерения и триграммный индекс по названию
+    для поиска по подстроке и нечёткого поиска.
     """
 
     name = models.CharField(
@@ -70,12 +78,58 @@ class Ingredient(models.Model):
                 name="uniqe_name_unit",
             )
         ]
+        indexes = [
+            GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="ingredient_name_trgm_idx",
+            )
+        ]
 
     def __str__(self):
         return f"Ingredient: {self.name}"
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """
+    Набор запросов для рецептов.
+    Позволяет получить страницу рецептов вместе со связанными данными
+    за фиксированное число запросов.
+    """
+
+    def with_related(self):
+        """
+        Подгружает автора, теги и ингредиенты.
+        """
+
+        return self.select_related("author").prefetch_related(
+            "tags",
+            Prefetch(
+                "recipe_ingredients",
+                queryset=RecipeIngredient.objects.select_related(
+                    "ingredient"
+                ).order_by("pk"),
+            ),
+        )
+
+    def top_for_authors(self, author_ids, limit=None):
+        """
+        Первые limit рецептов (по названию) каждого из авторов
+        одним запросом с ROW_NUMBER() OVER (PARTITION BY author_id).
+        """
+
+        queryset = self.filter(author_id__in=author_ids)
+        if limit is not None:
+            queryset = queryset.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F("author_id"),
+                    order_by=(F("name").asc(), F("id").asc()),
+                )
+            ).filter(row_number__lte=limit)
+        return queryset.order_by("author_id", "name", "id")
+
+
+class Recipe(CountersModelMixin, models.Model):
     """
     Модель для рецептов.
     Описаны поля:
@@ -88,7 +142,12 @@ class Recipe(models.Model):
     ingredients - ингредиенты к рецепту (many-to-many
     с моделью Ingredient);
     pub_date - автоматически добавляющаяся дата публикации;
-    cooking_time - время приготовления с указанием границ (int).
+    cooking_time - время приготовления с указанием границ (int);
+    search_vector - поисковый вектор по названию и описанию,
+    поддерживается триггером в базе данных;
+    favorites_count, in_cart_count - счётчики добавлений в избранное
+    и в списки покупок;
+    image_variants - уменьшенные копии картинки, строятся в фоне.
     На уровне базы данных по умолчанию сортировка по названию.
     """
 
@@ -152,14 +211,49 @@ class Recipe(models.Model):
         verbose_name="Код короткой ссылки",
         help_text="Уникальный код для короткой ссылки на рецепт",
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name="Поисковый вектор",
+    )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Уменьшенные копии картинки",
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="В избранном",
+    )
+    in_cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="В списках покупок",
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    counter_fields = ("favorites_count", "in_cart_count")
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ("name",)
-
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
+        indexes = [
+            models.Index(
+                fields=("-pub_date", "-id"),
+                name="recipe_pub_date_id_idx",
+            ),
+            GinIndex(
+                fields=("search_vector",),
+                name="recipe_search_vector_idx",
+            ),
+            models.Index(
+                fields=("-favorites_count", "-pub_date", "-id"),
+                name="recipe_popularity_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Recipe: {self.name}"
@@ -235,6 +329,50 @@ class ShoppingCart(models.Model):
     class Meta:
         verbose_name = "Корзина"
         verbose_name_plural = "Корзины"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "recipe"),
+                name="unique_shopping_cart",
+            )
+        ]
+
+
+class ShoppingCartIngredient(models.Model):
+    """
+    Итоговое количество каждого ингредиента в списке покупок
+    пользователя. Поддерживается инкрементально при изменении корзины
+    и рецептов в ней, чтобы выгрузка не пересчитывала сумму
+    по всем рецептам корзины.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_cart_ingredients",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_cart_ingredients",
+        verbose_name="Ингредиент",
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name="Количество",
+    )
+
+    class Meta:
+        verbose_name = "Ингредиент списка покупок"
+        verbose_name_plural = "Ингредиенты списков покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "ingredient"),
+                name="unique_shopping_cart_ingredient",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.ingredient} x {self.total_amount}"
 
 
 class Favorite(models.Model):
@@ -258,3 +396,134 @@ class Favorite(models.Model):
 
     class Meta:
         verbose_name = "Избранное"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "recipe"),
+                name="unique_favorite",
+            )
+        ]
+
+
+class ExportJob(models.Model):
+    """
+    Задача фоновой выгрузки списка покупок.
+    Очередь хранится в базе данных и разбирается командой
+    run_export_worker. Описаны поля:
+    user - пользователь, чей список выгружается;
+    export_format - формат файла;
+    status - состояние задачи;
+    key - ключ готового файла в кеше выгрузок;
+    error - текст ошибки для неудачной задачи;
+    created, started, finished - время постановки, начала и окончания;
+    expires_at - время, после которого задача и файл удаляются.
+    """
+
+    class Format(models.TextChoices):
+        DOCX = "docx", "DOCX"
+        TXT = "txt", "Текст"
+        CSV = "csv", "CSV"
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "В очереди"
+        RUNNING = "running", "Выполняется"
+        DONE = "done", "Готово"
+        FAILED = "failed", "Ошибка"
+
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="export_jobs",
+        verbose_name="Пользователь",
+    )
+    export_format = models.CharField(
+        max_length=cnst.MAX_LENGHT_SMALL,
+        choices=Format.choices,
+        default=Format.DOCX,
+        verbose_name="Формат",
+    )
+    status = models.CharField(
+        max_length=cnst.MAX_LENGHT_SMALL,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name="Состояние",
+    )
+    key = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name="Ключ файла",
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="Ошибка",
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Поставлена",
+    )
+    started = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Начата",
+    )
+    finished = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Завершена",
+    )
+    expires_at = models.DateTimeField(
+        verbose_name="Истекает",
+    )
+
+    class Meta:
+        verbose_name = "Выгрузка списка покупок"
+        verbose_name_plural = "Выгрузки списков покупок"
+        ordering = ("-created",)
+        indexes = [
+            models.Index(
+                fields=("created",),
+                condition=models.Q(status="pending"),
+                name="export_job_pending_idx",
+            ),
+            models.Index(
+                fields=("expires_at",),
+                name="export_job_expires_at_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Выгрузка {self.export_format} ({self.status})"
+
+
+class MediaFile(models.Model):
+    """
+    Счётчик ссылок на медиафайл, адресуемый по содержимому.
+    Один файл может быть картинкой или уменьшенной копией
+    у нескольких рецептов и пользователей. Описаны поля:
+    name - имя файла в хранилище;
+    references_count - число ссылок на файл из строк рецептов
+    и пользователей.
+    Счётчик меняется в той же транзакции, что и сами ссылки,
+    а файл удаляется только когда счётчик дошёл до нуля.
+    """
+
+    name = models.CharField(
+        max_length=255,
+        primary_key=True,
+        verbose_name="Файл",
+    )
+    references_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Число ссылок",
+    )
+
+    class Meta:
+        verbose_name = "Медиафайл"
+        verbose_name_plural = "Медиафайлы"
+
+    def __str__(self):
+        return f"{self.name} ({self.references_count})"
@@ -0,0 +1,112 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from api import (
+    cart_totals,
+    catalog,
+    fragments,
+    images,
+    media,
+    relations,
+    short_links,
+    versions,
+)
+from food.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_saving(sender, instance, update_fields=None, **kwargs):
+    """
+    Запоминает файлы, на которые рецепт ссылался до сохранения.
+    """
+
+    media.remember_files(instance, "image", "image_variants", update_fields)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created=False, **kwargs):
+    """
+    Учитывает ссылки рецепта на файлы, выдаёт новому рецепту короткий
+    код и ставит в очередь построение уменьшенных копий новой картинки.
+    """
+
+    media.update_files(instance, "image", "image_variants")
+    if created and not instance.short_code:
+        short_links.assign(instance)
+    images.schedule(
+        instance, "image", "image_variants", fragments.bump_recipe
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    """
+    Вычитает ингредиенты удаляемого рецепта из итогов списков покупок,
+    пока строки корзин ещё не удалены каскадом, и освобождает
+    картинки рецепта.
+    """
+
+    cart_totals.propagate_recipe(
+        instance.pk, cart_totals.recipe_amounts(instance.pk), {}
+    )
+    media.release_stored(instance, "image", "image_variants")
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """
+    Сбрасывает закешированное представление удалённого рецепта
+    и его запись в кеше коротких ссылок.
+    """
+
+    fragments.bump_recipe(instance.pk)
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: short_links.forget(recipe_id))
+
+
+def catalog_changed(version):
+    """
+    Перезаписывает снимок каталога и только затем меняет версию,
+    чтобы процессы не перечитали по новой версии старые данные.
+    """
+
+    catalog.write_snapshot()
+    versions.bump_version(version)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    """
+    Обновляет снимок каталога, реестр тегов и представления рецептов
+    после изменения тегов.
+    """
+
+    transaction.on_commit(lambda: catalog_changed(versions.TAGS))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    """
+    Обновляет снимок каталога и представления рецептов
+    после изменения ингредиентов.
+    """
+
+    transaction.on_commit(lambda: catalog_changed(versions.INGREDIENTS))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def relation_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает закешированные связи пользователя при изменении
+    избранного и списка покупок в обход API: в админке
+    и при каскадном удалении.
+    """
+
+    relations.relations_changed(instance.user_id)
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+
+
+def lock_names(names):
+    """
+    Берёт транзакционные advisory-блокировки на имена файлов.
+    Запись файла и его удаление сборщиком выполняются под одной
+    и той же блокировкой, поэтому сборщик не удалит файл, который
+    ещё не зафиксированная транзакция только что переиспользовала.
+    Блокировки снимаются при завершении транзакции.
+    """
+
+    with connection.cursor() as cursor:
+        for name in sorted(set(names)):
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))",
+                [name],
+            )
+
+
+class ContentHashStorage(FileSystemStorage):
+    """
+    Хранилище медиафайлов, адресуемых по содержимому.
+    Файл получает имя по sha256 содержимого в каталоге upload_to,
+    поэтому одинаковые картинки хранятся на диске один раз:
+    если такой файл уже есть, повторная запись пропускается.
+    Удалять файлы следует через api.media.release, который
+    учитывает счётчик ссылок MediaFile.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, f"{digest.hexdigest()}{extension}")
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым, суффиксы не добавляются.
+        return name
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        # Блокировка держится до конца внешней транзакции,
+        # в которой на файл появится ссылка.
+        with transaction.atomic():
+            lock_names([name])
+            if self.exists(name):
+                return name
+            return super().save(name, content, max_length)
+
+    def _save(self, name, content):
+        # Пишем во временный файл и переименовываем его: при гонке
+        # двух одинаковых загрузок файл просто заменится тем же
+        # содержимым, а не получит новое имя.
+        tmp_name = os.path.join(
+            os.path.dirname(name), f".upload-{uuid.uuid4().hex}"
+        )
+        tmp_path = self.path(tmp_name)
+        try:
+            super()._save(tmp_name, content)
+            os.replace(tmp_path, self.path(name))
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return name
@@ -1,8 +1,8 @@
-from food.models import Recipe
+from django.shortcuts import redirect
 
-from django.shortcuts import get_object_or_404, redirect
+from api.short_links import get_recipe_id_or_404
 
 
 def redirect_recipe(request, pk):
-    recipe = get_object_or_404(Recipe, pk=pk)
-    return redirect(f"recipes/{recipe.pk}/")
+    recipe_id = get_recipe_id_or_404(pk)
+    return redirect(f"recipes/{recipe_id}/")
@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "djoser",
@@ -91,6 +92,28 @@ REST_FRAMEWORK = {
 }
 
 
+# Версии данных, фрагменты и кеш выгрузок должны быть общими для всех
+# процессов gunicorn и воркера выгрузок, поэтому по умолчанию кеш
+# хранится в Redis.
+CACHE_BACKEND = os.getenv(
+    "CACHE_BACKEND", "django.core.cache.backends.redis.RedisCache"
+)
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION", "redis://redis:6379/0"),
+    },
+}
+if not CACHE_BACKEND.endswith(".RedisCache"):
+    # Файловый кеш и кеш в памяти годятся только для разработки
+    # на одной машине. Сверх MAX_ENTRIES они удаляют часть записей
+    # при каждой записи, а файловый кеш ещё и обходит весь каталог,
+    # поэтому предел задаётся с запасом (CACHE_MAX_ENTRIES).
+    CACHES["default"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", 100000)),
+    }
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -141,6 +164,41 @@ STATIC_ROOT = BASE_DIR / "static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = "media"
 
+STORAGES = {
+    "default": {
+        "BACKEND": "food.storage.ContentHashStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+CATALOG_SNAPSHOT_PATH = os.getenv(
+    "CATALOG_SNAPSHOT_PATH", BASE_DIR / "catalog.snapshot"
+)
+
+SHOPPING_LIST_EXPORT_ROOT = os.getenv(
+    "SHOPPING_LIST_EXPORT_ROOT", BASE_DIR / "exports"
+)
+SHOPPING_LIST_EXPORT_TTL = int(
+    os.getenv("SHOPPING_LIST_EXPORT_TTL", 60 * 60 * 24 * 7)
+)
+
+# Загружаемые файлы всегда пишутся во временный файл на диске,
+# а не держатся в памяти процесса.
+FILE_UPLOAD_HANDLERS = [
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+
+EXPORT_JOB_TTL = int(os.getenv("EXPORT_JOB_TTL", 60 * 60))
+EXPORT_JOB_TIMEOUT = int(os.getenv("EXPORT_JOB_TIMEOUT", 10 * 60))
+EXPORT_WORKER_PROCESSES = int(os.getenv("EXPORT_WORKER_PROCESSES", 2))
+EXPORT_WORKER_POLL_INTERVAL = float(
+    os.getenv("EXPORT_WORKER_POLL_INTERVAL", 1)
+)
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 CSRF_TRUSTED_ORIGINS = os.getenv("CSRF_TRUSTED", default="https://*, http://*").split(", ")
@@ -15,6 +15,8 @@ class CustomUserAdmin(UserAdmin):
         "email",
         "first_name",
         "last_name",
+        "recipes_count",
+        "subscribers_count",
     )
     list_filter = (
         "username",
@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-17 04:11
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("id"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    ExtendedUser = apps.get_model("users", "ExtendedUser")
+    Recipe = apps.get_model("food", "Recipe")
+    Sub = apps.get_model("users", "Sub")
+    ExtendedUser.objects.update(
+        recipes_count=count_of(Recipe, "author"),
+        subscribers_count=count_of(Sub, "author"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_alter_extendeduser_managers"),
+        ("food", "0006_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="extendeduser",
+            name="recipes_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Рецептов"
+            ),
+        ),
+        migrations.AddField(
+            model_name="extendeduser",
+            name="subscribers_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Подписчиков"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
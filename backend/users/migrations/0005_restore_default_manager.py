@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-17 05:37
+
+import django.contrib.auth.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_image_variants"),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name="extendeduser",
+            managers=[
+                ("objects", django.contrib.auth.models.UserManager()),
+            ],
+        ),
+    ]
@@ -1,13 +1,23 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 
 from api import constants
+from api.counters import CountersModelMixin
 
 
-class ExtendedUser(AbstractUser):
+class ExtendedUserManager(UserManager):
+    """
+    Прежний менеджер пользователей. Модель им больше не пользуется,
+    класс оставлен для миграции 0002_alter_extendeduser_managers.
+    """
+
+
+class ExtendedUser(CountersModelMixin, AbstractUser):
     """
     Модель пользователя на основе импортируемой абстрактной модели.
     Переопределены поля юзернейма, электронной почты, имени и фамилии.
+    recipes_count и subscribers_count - счётчики рецептов и подписчиков,
+    avatar_variants - уменьшенные копии аватара, строятся в фоне.
     На уровне базы данных задана сортировка по id.
     """
 
@@ -28,10 +38,28 @@ class ExtendedUser(AbstractUser):
         default="avatars/default_avatar.png",
         null=True,
     )
+    avatar_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Уменьшенные копии аватара",
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Рецептов",
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Подписчиков",
+    )
 
     REQUIRED_FIELDS = ["username", "first_name", "last_name", "password"]
     USERNAME_FIELD = "email"
 
+    counter_fields = ("recipes_count", "subscribers_count")
+
     class Meta:
         ordering = ("username",)
         verbose_name = "Пользователь"
@@ -0,0 +1,62 @@
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from api import fragments, images, media, relations
+from users.models import ExtendedUser, Sub
+
+
+@receiver(pre_save, sender=ExtendedUser)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    """
+    Проставляет готовые копии аватара по умолчанию и запоминает
+    файлы, на которые пользователь ссылался до сохранения.
+    """
+
+    images.copy_shared_variants(
+        instance, "avatar", "avatar_variants", update_fields
+    )
+    media.remember_files(
+        instance, "avatar", "avatar_variants", update_fields
+    )
+
+
+@receiver(post_save, sender=ExtendedUser)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    """
+    Учитывает ссылки аватара на файлы и сбрасывает представления
+    рецептов автора при изменении его профиля или аватара.
+    Обновление только last_login профиль не меняет.
+    """
+
+    media.update_files(instance, "avatar", "avatar_variants")
+    if update_fields and set(update_fields) == {"last_login"}:
+        return
+    fragments.bump_user(instance.pk)
+    images.schedule(
+        instance, "avatar", "avatar_variants", fragments.bump_user
+    )
+
+
+@receiver(pre_delete, sender=ExtendedUser)
+def user_deleting(sender, instance, **kwargs):
+    """
+    Освобождает аватар удалённого пользователя,
+    если он больше нигде не используется.
+    """
+
+    media.release_stored(instance, "avatar", "avatar_variants")
+
+
+@receiver((post_save, post_delete), sender=Sub)
+def subscription_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает закешированные подписки пользователя при изменении
+    подписок в обход API: в админке и при каскадном удалении.
+    """
+
+    relations.relations_changed(instance.user_id)